@@ -15,24 +15,34 @@ import bpy.utils.previews
 from bpy.types import Panel, Operator, PropertyGroup, UIList
 from bpy.props import (
     StringProperty, BoolProperty, IntProperty, CollectionProperty,
-    PointerProperty, EnumProperty
+    PointerProperty, EnumProperty, FloatProperty
 )
 from bpy.app.handlers import persistent
 
 # Import your module components
 from .material_list import (
-    MaterialItem, MaterialCache,
+    MaterialRow,
     MATERIALBROWSER_UL_items, MATERIALBROWSER_PT_Panel,
     MATERIALBROWSER_OT_RefreshCache, MATERIALBROWSER_OT_AppendMaterial,
     MATERIALBROWSER_OT_LinkMaterial, MATERIALBROWSER_OT_SelectMaterial,
+    MATERIALBROWSER_OT_ExportProfile, MATERIALBROWSER_OT_ResetProfile,
+    MATERIALBROWSER_OT_CancelRefresh, MATERIALBROWSER_OT_FindSimilar,
     update_material_browser_filter, update_change_file_path,
-    update_material_browser_category, preview_collections,
-    KEYWORD_CATEGORIES, load_previews_on_start,
+    update_material_browser_category, update_material_browser_profiling,
+    update_material_browser_batched_io, update_material_browser_mirror,
+    update_material_browser_index,
+    preview_collections,
+    material_browser_category_items, load_previews_on_start, watch_index_timer,
+    INDEX_POLL_INTERVAL,
 )
 
+from .refresh_job import cancel_all_jobs
+from .prefetch import PREFETCHER
+
 from .preview_render import (
     MATERIALPREVIEW_UL_log_list,
     MATERIALPREVIEW_OT_start_render,
+    MATERIALPREVIEW_OT_calibrate,
     MATERIALPREVIEW_PT_panel,
 )
 
@@ -68,9 +78,57 @@ class MaterialPreviewProps(PropertyGroup):
         description="File format for saved previews",
         items=[
             ("PNG", "PNG", "Save as .png"),
-            ("JPEG", "JPG", "Save as .jpg")
+            ("JPEG", "JPG", "Save as .jpg"),
+            ("PACKED", "Packed", "Keep the raw pixels in one pack file per library, "
+                                 "which the browser loads without decoding images")
         ],
-        default="PNG"
+        default="PACKED"
+    )
+    progressive_render: BoolProperty(
+        name="Progressive (Draft First)",
+        default=True,
+        description="Render a fast low-quality draft of every material first, then replace the drafts at full quality"
+    )
+    worker_memory_limit_mb: IntProperty(
+        name="Worker Memory Limit (MB)",
+        default=4096,
+        min=0,
+        description="Restart a render worker once it uses more memory than this. 0 disables recycling"
+    )
+    image_cache_mb: IntProperty(
+        name="Texture Cache (MB)",
+        default=512,
+        min=0,
+        description="Memory each worker may spend keeping textures loaded for later materials"
+    )
+    material_timeout: IntProperty(
+        name="Material Timeout (s)",
+        default=300,
+        min=0,
+        description="Kill and restart a worker that spends longer than this on one material. 0 disables the timeout"
+    )
+    max_attempts: IntProperty(
+        name="Max Attempts",
+        default=3,
+        min=1,
+        description="Failed materials are retried with increasing delays, then quarantined after this many failures"
+    )
+    resume_render: BoolProperty(
+        name="Resume Interrupted Run",
+        default=True,
+        description="Continue an interrupted render run from its journal instead of starting over"
+    )
+    render_workers: IntProperty(
+        name="Render Workers",
+        default=0,
+        min=0,
+        description="Workers rendering at the same time, sharing the CPU cores between them. "
+                    "0 uses the calibrated count for this machine, or one worker per 4 cores"
+    )
+    pin_workers: BoolProperty(
+        name="Pin to Cores",
+        default=False,
+        description="Bind each worker to its own cores (Linux only)"
     )
     active_index: IntProperty(default=0)
     log_items: CollectionProperty(type=LogLine)
@@ -81,18 +139,22 @@ classes = (
     MaterialPreviewProps,
 
     # Browser
-    MaterialItem,
-    MaterialCache,
+    MaterialRow,
     MATERIALBROWSER_UL_items,
     MATERIALBROWSER_PT_Panel,
     MATERIALBROWSER_OT_RefreshCache,
+    MATERIALBROWSER_OT_CancelRefresh,
+    MATERIALBROWSER_OT_FindSimilar,
     MATERIALBROWSER_OT_AppendMaterial,
     MATERIALBROWSER_OT_LinkMaterial,
     MATERIALBROWSER_OT_SelectMaterial,
+    MATERIALBROWSER_OT_ExportProfile,
+    MATERIALBROWSER_OT_ResetProfile,
 
     # Renderer
     MATERIALPREVIEW_UL_log_list,
     MATERIALPREVIEW_OT_start_render,
+    MATERIALPREVIEW_OT_calibrate,
     MATERIALPREVIEW_PT_panel,
 )
 
@@ -115,6 +177,47 @@ def register():
         update=update_material_browser_filter
     )
 
+    bpy.types.Scene.material_browser_search_mode = EnumProperty(
+        name="Search Mode",
+        description="How the filter text is matched against material names",
+        items=[
+            ("SUBSTRING", "Exact", "Show every material whose name contains the filter text, in index order"),
+            ("FUZZY", "Fuzzy", "Rank materials by similarity to the filter text, tolerating typos"),
+        ],
+        default="SUBSTRING",
+        update=update_material_browser_filter
+    )
+
+    bpy.types.Scene.material_browser_max_results = IntProperty(
+        name="Max Results",
+        description="Number of best fuzzy matches to show",
+        default=200,
+        min=1,
+        max=10000,
+        update=update_material_browser_filter
+    )
+
+    bpy.types.Scene.material_browser_sort = EnumProperty(
+        name="Sort",
+        description="Order of the material list",
+        items=[
+            ("DEFAULT", "Default", "Index order, or relevance when fuzzy searching"),
+            ("NAME", "Name", "Alphabetical"),
+            ("MEMORY", "Memory", "Heaviest estimated texture memory first"),
+            ("NODES", "Node Count", "Most shader nodes first"),
+        ],
+        default="DEFAULT",
+        update=update_material_browser_filter
+    )
+
+    bpy.types.Scene.material_browser_max_memory = FloatProperty(
+        name="Max Memory (MB)",
+        description="Hide materials whose textures are estimated to need more memory than this. 0 shows all",
+        default=0.0,
+        min=0.0,
+        update=update_material_browser_filter
+    )
+
     bpy.types.Scene.enable_displacement = BoolProperty(
         name="Enable Displacement",
         description="Add displacement modifier if height texture found",
@@ -123,11 +226,9 @@ def register():
 
     bpy.types.Scene.material_browser_category = EnumProperty(
         name="Category",
-        description="Filter by category",
-        items=[("All", "All", "")] +
-              [(cat, cat, "") for cat in sorted(KEYWORD_CATEGORIES.keys())] +
-              [("Uncategorized", "Uncategorized", "")],
-        default="All",
+        description="Filter by category. Nothing selected shows all materials",
+        items=material_browser_category_items,
+        options={'ENUM_FLAG'},
         update=update_material_browser_category
     )
 
@@ -141,10 +242,9 @@ def register():
         default="Materials: 0"
     )
 
-    bpy.types.Scene.material_browser_items = CollectionProperty(type=MaterialItem)
-    bpy.types.Scene.material_browser_filtered_items = CollectionProperty(type=MaterialItem)
-    bpy.types.Scene.material_browser_index = IntProperty()
-    bpy.types.Scene.material_cache = PointerProperty(type=MaterialCache)
+    # Visible list rows; runtime only, so not saved into .blend files
+    bpy.types.WindowManager.material_browser_rows = CollectionProperty(type=MaterialRow)
+    bpy.types.Scene.material_browser_index = IntProperty(update=update_material_browser_index)
 
     bpy.types.Scene.material_browser_selected_material = StringProperty(
         name="Selected Material"
@@ -157,21 +257,91 @@ def register():
         default=""
     )
 
+    bpy.types.Scene.material_browser_batched_io = BoolProperty(
+        name="Network Library",
+        description="List each library folder once and answer file checks from that listing for a few seconds. "
+                    "Much faster on network shares (NFS/SMB), where every file check is a round trip",
+        default=False,
+        update=update_material_browser_batched_io
+    )
+
+    bpy.types.Scene.material_browser_similar_to = StringProperty(
+        name="Similar To",
+        description="Library and name of the material the list is ranked against",
+        default="",
+        update=update_material_browser_filter
+    )
+
+    bpy.types.Scene.material_browser_prefetch = BoolProperty(
+        name="Prefetch",
+        description="Read the selected material's library and textures in the background, "
+                    "so Append and Link don't wait on the disk or network",
+        default=True
+    )
+
+    bpy.types.Scene.material_browser_use_mirror = BoolProperty(
+        name="Local Mirror",
+        description="Copy library files and thumbnails to a local folder on first use and read them from there. "
+                    "Linking still points at the library folder",
+        default=False,
+        update=update_material_browser_mirror
+    )
+
+    bpy.types.Scene.material_browser_mirror_path = StringProperty(
+        name="Mirror Folder",
+        description="Local folder for mirrored libraries (empty: the user cache folder)",
+        subtype='DIR_PATH',
+        default="",
+        update=update_material_browser_mirror
+    )
+
+    bpy.types.Scene.material_browser_mirror_quota_gb = FloatProperty(
+        name="Mirror Quota",
+        description="Disk space the mirror may use; least recently used copies are removed beyond it",
+        default=10.0,
+        min=0.1,
+        update=update_material_browser_mirror
+    )
+
+    # Debug / profiling
+    bpy.types.Scene.material_browser_show_debug = BoolProperty(
+        name="Show Debug",
+        description="Show timing statistics for the material browser",
+        default=False
+    )
+
+    bpy.types.Scene.material_browser_profiling = BoolProperty(
+        name="Record Timings",
+        description="Record call counts and timings of scanning, parsing, filtering, drawing and rendering",
+        default=False,
+        update=update_material_browser_profiling
+    )
+
     # Thumbnail previews
     preview_collections["material_thumbs"] = bpy.utils.previews.new()
 
     # Safe loading after .blend load
     if load_previews_on_start not in bpy.app.handlers.load_post:
         bpy.app.handlers.load_post.append(load_previews_on_start)
-    
+
+    # Index the current file's folder once the add-on is up
+    bpy.app.timers.register(lambda: load_previews_on_start(None), first_interval=0.1)
+    # Pick up indexes other artists rewrite in a shared library
+    bpy.app.timers.register(watch_index_timer, first_interval=INDEX_POLL_INTERVAL, persistent=True)
+
     bpy.types.Scene.material_preview_props = PointerProperty(type=MaterialPreviewProps)
     bpy.types.Scene.material_preview_log_text = bpy.props.PointerProperty(type=bpy.types.Text)
 
 
 def unregister():
+    cancel_all_jobs()
+    PREFETCHER.cancel()
+
     # Remove handler
     if load_previews_on_start in bpy.app.handlers.load_post:
         bpy.app.handlers.load_post.remove(load_previews_on_start)
+    if bpy.app.timers.is_registered(watch_index_timer):
+        bpy.app.timers.unregister(watch_index_timer)
 
     # Free thumbnails
     pcoll = preview_collections.get("material_thumbs")
@@ -183,15 +353,22 @@ def unregister():
     props = [
         "material_preview_props", "material_preview_log_text",
         "material_browser_path", "material_browser_filter",
+        "material_browser_search_mode", "material_browser_max_results",
+        "material_browser_sort", "material_browser_max_memory",
         "enable_displacement", "material_browser_category",
         "material_browser_material_count", "material_browser_material_category_count",
-        "material_browser_items", "material_browser_filtered_items",
-        "material_browser_index", "material_cache",
-        "material_browser_selected_material", "previews_folder_path"
+        "material_browser_index",
+        "material_browser_selected_material", "previews_folder_path",
+        "material_browser_show_debug", "material_browser_profiling",
+        "material_browser_batched_io", "material_browser_use_mirror", "material_browser_prefetch",
+        "material_browser_similar_to",
+        "material_browser_mirror_path", "material_browser_mirror_quota_gb"
     ]
     for prop in props:
         if hasattr(bpy.types.Scene, prop):
             delattr(bpy.types.Scene, prop)
+    if hasattr(bpy.types.WindowManager, "material_browser_rows"):
+        del bpy.types.WindowManager.material_browser_rows
 
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
@@ -0,0 +1,238 @@
+# Minimal stand-in for Blender's `bpy` module so the add-on modules can be
+# imported and benchmarked under plain CPython. Only the surface touched by
+# the add-on's hot paths is provided; anything else is a no-op.
+
+import os
+import sys
+import types
+import itertools
+import contextlib
+
+
+# ---------- RNA-ish containers ----------
+class StubItem:
+    # Unset RNA properties read back as their defaults
+    DEFAULTS = {"store_id": -1}
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.DEFAULTS.get(name, "")
+
+
+class StubCollection(list):
+    def add(self):
+        item = StubItem()
+        self.append(item)
+        return item
+
+    def remove(self, index):
+        del self[index]
+
+    def foreach_set(self, attr, values):
+        for item, value in zip(self, values):
+            setattr(item, attr, value)
+
+
+class StubIDCollection(dict):
+    def get(self, key, default=None):
+        return super().get(key, default)
+
+    def remove(self, datablock):
+        for key, value in list(self.items()):
+            if value is datablock:
+                del self[key]
+
+
+class StubLayout:
+    # Every layout call returns another layout so chained UI code just works
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return StubLayout()
+        return call
+
+
+class StubScene:
+    def __init__(self):
+        self.name = "Scene"
+        self.material_browser_path = ""
+        self.material_browser_filter = ""
+        self.material_browser_search_mode = "SUBSTRING"
+        self.material_browser_max_results = 200
+        self.material_browser_sort = "DEFAULT"
+        self.material_browser_max_memory = 0.0
+        self.material_browser_category = set()
+        self.material_browser_material_count = "Materials: 0"
+        self.material_browser_material_category_count = "Materials: 0"
+        self.material_browser_index = 0
+        self.material_browser_selected_material = ""
+        self.enable_displacement = False
+        self.previews_folder_path = ""
+        self.material_browser_show_debug = True
+        self.material_browser_profiling = False
+        self.material_browser_batched_io = False
+        self.material_browser_use_mirror = False
+        self.material_browser_prefetch = True
+        self.material_browser_similar_to = ""
+        self.material_browser_mirror_path = ""
+        self.material_browser_mirror_quota_gb = 10.0
+
+
+class StubContext:
+    def __init__(self):
+        self.scene = StubScene()
+        self.selected_objects = []
+        self.screen = types.SimpleNamespace(areas=[])
+        self.window_manager = types.SimpleNamespace(windows=[], material_browser_rows=StubCollection())
+
+
+# ---------- bpy.utils.previews ----------
+class StubPixels:
+    values = ()
+
+    def foreach_set(self, values):
+        # Blender copies the buffer in C
+        self.values = bytes(values)
+
+
+class StubPreview:
+    def __init__(self, icon_id, filepath):
+        self.icon_id = icon_id
+        self.filepath = filepath
+        self.image_size = (0, 0)
+        self.image_pixels = StubPixels()
+
+
+class StubPreviewCollection(dict):
+    _icon_ids = itertools.count(1)
+
+    def load(self, name, filepath, filetype, force_reload=False):
+        # Blender registers the path and decodes lazily on first draw,
+        # so a stat is the closest cheap equivalent of the real call.
+        if name in self and not force_reload:
+            raise KeyError(f"key {name!r} already exists")
+        os.stat(filepath)
+        preview = StubPreview(next(self._icon_ids), filepath)
+        self[name] = preview
+        return preview
+
+    def new(self, name):
+        preview = StubPreview(next(self._icon_ids), "")
+        self[name] = preview
+        return preview
+
+    def close(self):
+        self.clear()
+
+
+# ---------- bpy.data.libraries ----------
+class StubLibraries:
+    def __init__(self):
+        # abs .blend path -> list of material names, filled by the benchmark
+        self.contents = {}
+
+    @contextlib.contextmanager
+    def load(self, filepath, link=False, relative=False):
+        names = self.contents.get(os.path.abspath(filepath))
+        if names is None:
+            raise OSError(f"cannot read file '{filepath}'")
+        data_from = types.SimpleNamespace(materials=list(names), images=[], node_groups=[])
+        data_to = types.SimpleNamespace(materials=[], images=[], node_groups=[])
+        yield data_from, data_to
+        # Like Blender, requested names come back as (node-less) datablocks
+        data_to.materials = [
+            types.SimpleNamespace(name=name, use_nodes=False, node_tree=None)
+            for name in data_to.materials if name in names
+        ]
+
+
+@contextlib.contextmanager
+def temp_data(filepath=None):
+    yield types.SimpleNamespace(libraries=bpy_module().data.libraries)
+
+
+def bpy_module():
+    return sys.modules["bpy"]
+
+
+def install():
+    """Register the stub as `bpy` (and its submodules) in sys.modules."""
+    if "bpy" in sys.modules:
+        return sys.modules["bpy"]
+
+    bpy = types.ModuleType("bpy")
+    bpy.__stub__ = True
+
+    # bpy.types
+    bpy_types = types.ModuleType("bpy.types")
+    for name in ("Panel", "Operator", "PropertyGroup", "UIList", "Text", "Menu",
+                 "Scene", "WindowManager", "AddonPreferences"):
+        setattr(bpy_types, name, type(name, (), {}))
+
+    # bpy.props: property definitions only need to evaluate
+    bpy_props = types.ModuleType("bpy.props")
+    for name in ("StringProperty", "BoolProperty", "IntProperty", "FloatProperty",
+                 "EnumProperty", "CollectionProperty", "PointerProperty",
+                 "FloatVectorProperty", "IntVectorProperty", "BoolVectorProperty"):
+        setattr(bpy_props, name, lambda *args, _name=name, **kwargs: (_name, kwargs))
+
+    # bpy.app
+    bpy_app = types.ModuleType("bpy.app")
+    bpy_app_handlers = types.ModuleType("bpy.app.handlers")
+    bpy_app_handlers.persistent = lambda func: func
+    bpy_app_handlers.load_post = []
+    bpy_app.handlers = bpy_app_handlers
+    bpy_app.timers = types.SimpleNamespace(
+        register=lambda func, first_interval=0.0, persistent=False: None,
+        unregister=lambda func: None,
+        is_registered=lambda func: False,
+    )
+    bpy_app.binary_path = ""
+    bpy_app.version = (4, 4, 3)
+    bpy_app.background = True
+
+    # bpy.utils
+    bpy_utils = types.ModuleType("bpy.utils")
+    bpy_utils_previews = types.ModuleType("bpy.utils.previews")
+    bpy_utils_previews.new = StubPreviewCollection
+    bpy_utils_previews.remove = lambda pcoll: pcoll.close()
+    bpy_utils.previews = bpy_utils_previews
+    bpy_utils.register_class = lambda cls: None
+    bpy_utils.unregister_class = lambda cls: None
+
+    # bpy.path
+    bpy_path = types.ModuleType("bpy.path")
+    bpy_path.abspath = lambda path, start=None, library=None: path[2:] if path.startswith("//") else path
+    bpy_path.basename = os.path.basename
+
+    bpy.types = bpy_types
+    bpy.props = bpy_props
+    bpy.app = bpy_app
+    bpy.utils = bpy_utils
+    bpy.path = bpy_path
+    bpy.data = types.SimpleNamespace(
+        materials=StubIDCollection(),
+        images=StubIDCollection(),
+        node_groups=StubIDCollection(),
+        textures=StubIDCollection(),
+        libraries=StubLibraries(),
+        filepath="",
+    )
+    bpy.data.temp_data = temp_data
+    bpy.context = StubContext()
+    bpy.ops = types.SimpleNamespace()
+
+    sys.modules.update({
+        "bpy": bpy,
+        "bpy.types": bpy_types,
+        "bpy.props": bpy_props,
+        "bpy.app": bpy_app,
+        "bpy.app.handlers": bpy_app_handlers,
+        "bpy.utils": bpy_utils,
+        "bpy.utils.previews": bpy_utils_previews,
+        "bpy.path": bpy_path,
+    })
+    return bpy
@@ -0,0 +1,397 @@
+# Benchmark harness for the material browser hot paths.
+#
+# Plain CPython (uses the bpy stub):
+#   python benchmarks/run_benchmarks.py --files 40 --materials 25 --output bench.json
+#
+# Inside Blender (real bpy, real .blend files):
+#   blender --background --factory-startup --python benchmarks/run_benchmarks.py -- --files 8
+#
+# Results are written as JSON; pass --compare old.json to print the ratio of
+# each median against a previous run.
+
+import os
+import sys
+import json
+import time
+import shutil
+import builtins
+import argparse
+import platform
+import statistics
+import tempfile
+import importlib.util
+
+import numpy
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+try:
+    import bpy
+    USING_STUB = False
+except ImportError:
+    import bpy_stub
+    bpy = bpy_stub.install()
+    USING_STUB = True
+
+import synthetic_library
+
+ADDON_MODULE = "tmg_material_browser"
+
+
+def load_addon():
+    # Load the add-on folder as a package so its relative imports resolve,
+    # whatever the folder happens to be called on disk.
+    if ADDON_MODULE in sys.modules:
+        return sys.modules[ADDON_MODULE]
+    spec = importlib.util.spec_from_file_location(
+        ADDON_MODULE, os.path.join(ADDON_DIR, "__init__.py"),
+        submodule_search_locations=[ADDON_DIR],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[ADDON_MODULE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class ReportSink:
+    # Stands in for an operator's `self` in property update callbacks
+    def report(self, level, message):
+        print(f"[bench] {level}: {message}", file=sys.stderr)
+
+
+class SimulatedLatency:
+    """Add a fixed delay to every filesystem call and count the calls.
+
+    Patches the primitives os.path builds on, so exists/isdir/getsize are
+    covered too. DirEntry.stat() can't be patched; it is free on Windows
+    (SMB) anyway, as the directory listing already carries the metadata.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.calls = 0
+        self.saved = []
+
+    def wrap(self, func):
+        def delayed(*args, **kwargs):
+            self.calls += 1
+            time.sleep(self.seconds)
+            return func(*args, **kwargs)
+        return delayed
+
+    def __enter__(self):
+        for module, name in ((os, "stat"), (os, "lstat"), (os, "listdir"), (os, "scandir"),
+                             (os, "replace"), (os, "remove"), (builtins, "open")):
+            original = getattr(module, name)
+            self.saved.append((module, name, original))
+            setattr(module, name, self.wrap(original))
+        return self
+
+    def __exit__(self, *exc):
+        for module, name, original in reversed(self.saved):
+            setattr(module, name, original)
+        self.saved.clear()
+
+
+def time_call(func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples, items):
+    ordered = sorted(samples)
+    return {
+        "runs": len(samples),
+        "items": items,
+        "min_ms": ordered[0] * 1000.0,
+        "median_ms": statistics.median(ordered) * 1000.0,
+        "mean_ms": statistics.fmean(ordered) * 1000.0,
+        "max_ms": ordered[-1] * 1000.0,
+        "per_item_us": (statistics.median(ordered) / items * 1e6) if items else 0.0,
+    }
+
+
+def run(args):
+    addon = load_addon()
+    ml = addon.material_list
+    profiler = addon.profiling.PROFILER
+    profiler.enabled = args.profile
+    profiler.reset()
+
+    if not USING_STUB and not hasattr(bpy.types.Scene, "material_browser_path"):
+        # Running from a plain Blender session: register the scene properties
+        addon.register()
+
+    root = args.library or tempfile.mkdtemp(prefix="tmg_bench_")
+    keep = bool(args.library) or args.keep
+    context = bpy.context
+    scene = context.scene
+    sink = ReportSink()
+    results = {}
+    store_bytes = 0
+
+    def bench(name, func, items, setup=None, repeat=None):
+        samples = time_call(func, repeat or args.repeat, setup)
+        results[name] = summarize(samples, items)
+        print(f"{name:<28} {results[name]['median_ms']:10.3f} ms  ({items} items)", file=sys.stderr)
+
+    try:
+        library = synthetic_library.generate_library(
+            root, bpy,
+            num_files=args.files,
+            materials_per_file=args.materials,
+            num_previews=args.previews,
+            preview_size=args.preview_size,
+            preview_format=args.preview_format,
+            write_index=False,
+            seed=args.seed,
+        )
+        total = sum(len(names) for names in library.values())
+        all_names = [name for names in library.values() for name in names]
+        blend_paths = [os.path.join(root, blend_file) for blend_file in library]
+        json_paths = [
+            os.path.join(root, blend_file.replace(".blend", ml.CACHE_SUFFIX),
+                         ml.JSON_NAME.format(blend_file.replace(".blend", "")))
+            for blend_file in library
+        ]
+
+        def remove_indexes():
+            for json_path in json_paths:
+                if os.path.exists(json_path):
+                    os.remove(json_path)
+
+        # --- Scanning (cold: parses every library and writes the index) ---
+        scene.material_browser_path = root
+        bench("scan_cold", lambda: ml.update_change_file_path(sink, context), total,
+              setup=remove_indexes, repeat=max(1, args.repeat // 2))
+        bench("scan_warm", lambda: ml.update_change_file_path(sink, context), total)
+
+        # --- Network share: every filesystem call pays a round trip ---
+        if args.latency_ms > 0:
+            fs = addon.fsio.FS
+            for mode, batched in (("direct", False), ("batched", True)):
+                for kind, setup in (("cold", remove_indexes), ("warm", None)):
+                    name = f"net_scan_{kind}_{mode}"
+                    fs.enabled = batched
+                    with SimulatedLatency(args.latency_ms / 1000.0) as latency:
+                        bench(name, lambda: ml.update_change_file_path(sink, context), total,
+                              setup=setup, repeat=1)
+                    results[name]["fs_calls"] = latency.calls
+                    print(f"{'':<28} {latency.calls:10d} filesystem calls", file=sys.stderr)
+            fs.enabled = False
+            fs.invalidate()
+
+        # --- Indexing primitives ---
+        bench("parse_blend_file", lambda: [ml.parse_blend_file(p) for p in blend_paths], total)
+        bench("get_category", lambda: [ml.get_category(n) for n in all_names], total)
+
+        parsed = [ml.read_index(p)[0] for p in json_paths]
+        scratch = os.path.join(root, "_bench_index")
+        scratch_paths = [os.path.join(scratch, os.path.basename(p)) for p in json_paths]
+        # Locked, atomic writes as done during indexing
+        bench("index_write",
+              lambda: [ml.write_index(p, data, None) for p, data in zip(scratch_paths, parsed)], total)
+        bench("index_read", lambda: [ml.read_index(p) for p in scratch_paths], total)
+
+        entries = [dict(entry, blend_file=os.path.basename(p).replace(".json", ".blend"))
+                   for p, data in zip(json_paths, parsed) for entry in data]
+        # Same layout as the browser's store, feature column included
+        store = addon.material_store.MaterialStore(feature_dim=ml.material_store.feature_dim)
+        bench("store_load", lambda: store.add(entries, ml.get_category), total, setup=lambda: store.clear(root))
+        store_bytes = store.nbytes()
+        print(f"{'store_bytes':<28} {store_bytes / 1024:10.1f} KB  ({store_bytes / max(1, total):.0f} B/item)",
+              file=sys.stderr)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+        # --- Filtering ---
+        def filter_with(text, category, mode="SUBSTRING"):
+            def call():
+                scene.material_browser_filter = text
+                scene.material_browser_category = category
+                scene.material_browser_search_mode = mode
+                ml.filter_material_browser_items(scene)
+            return call
+
+        bench("filter_all", filter_with("", set()), total)
+        bench("filter_text", filter_with("wood", set()), total)
+        bench("filter_category", filter_with("", {"Metal"}), total)
+        bench("filter_multi_category", filter_with("", {"Metal", "Wood", "Stone"}), total)
+        bench("filter_text_category", filter_with("rust", {"Metal"}), total)
+        bench("filter_fuzzy", filter_with("concerete", set(), "FUZZY"), total)
+        bench("filter_fuzzy_category", filter_with("rusty", {"Metal"}, "FUZZY"), total)
+        bench("filter_fuzzy_short", filter_with("m", set(), "FUZZY"), total)
+        filter_with("wood", set())()
+        bench("category_counts", lambda: ml.material_browser_category_items(None, context),
+              len(ml.CATEGORY_NAMES))
+        filter_with("", set())()
+
+        # --- Similar materials: top-K over synthetic feature vectors ---
+        similarity = addon.similarity
+        rng = numpy.random.default_rng(args.seed)
+        rows = args.similar_rows
+        features = rng.random((rows, similarity.FEATURE_DIM), dtype=numpy.float32)
+        colors = rng.random((rows, similarity.COLOR_DIM), dtype=numpy.float32)
+        bench("similar_build", lambda: similarity.SimilarityIndex(features, colors), rows)
+        similar = similarity.SimilarityIndex(features, colors)
+        bench("similar_query", lambda: similar.query([rows // 2], 200), rows)
+        bench("similar_query_batch16", lambda: similar.query(list(range(16)), 200), rows * 16)
+
+        # --- Previews ---
+        # As the refresh job does it: every library's manifest into a fresh collection
+        manifests = {blend_file: ml.load_manifest(root, blend_file) for blend_file in library}
+        preview_count = sum(len(manifest["materials"]) for manifest in manifests.values())
+
+        def load_previews():
+            pcoll = bpy.utils.previews.new()
+            try:
+                for blend_file, manifest in manifests.items():
+                    ml.load_manifest_previews(pcoll, root, blend_file, manifest)
+            finally:
+                bpy.utils.previews.remove(pcoll)
+
+        bench("load_previews", load_previews, preview_count)
+
+        # --- Render output: encoded PNG files vs raw pixels in a pack ---
+        thumb_store, thumb_codec = addon.thumb_store, addon.thumb_codec
+        size = args.preview_size
+        gradient = numpy.linspace(0.0, 1.0, size * size * 4, dtype=numpy.float32).reshape(size, size, 4)
+        frames = [numpy.roll(gradient, i) for i in range(args.pack_thumbs)]
+        out_root = os.path.join(root, "_render_out")
+        counter = iter(range(10 ** 9))
+
+        def save_png():
+            pixels = frames[next(counter) % len(frames)]
+            thumb_store.store_bytes(out_root, thumb_codec.encode_png(pixels[::-1]), "png")
+
+        def save_pack():
+            pixels = frames[next(counter) % len(frames)]
+            thumb_store.append_to_pack(out_root, "Packed.blend", size, size, thumb_codec.to_rgba8(pixels).tobytes())
+
+        bench("thumb_save_png", save_png, 1)
+        bench("thumb_save_pack", save_pack, 1)
+        for pixels in frames:
+            thumb_store.append_to_pack(out_root, "Packed.blend", size, size, thumb_codec.to_rgba8(pixels).tobytes())
+        digests = set(thumb_store.read_pack(thumb_store.pack_path(out_root, "Packed.blend")))
+
+        def load_packed():
+            pcoll = bpy.utils.previews.new()
+            try:
+                ml.load_packed_previews(pcoll, out_root, "Packed.blend", digests)
+            finally:
+                bpy.utils.previews.remove(pcoll)
+
+        bench("load_packed_previews", load_packed, len(digests))
+
+        # --- Drawing: the panel plus one page of visible list rows ---
+        ul = ml.MATERIALBROWSER_UL_items()
+        panel = ml.MATERIALBROWSER_PT_Panel()
+        if USING_STUB:
+            ul.layout_type = "DEFAULT"
+            panel.layout = bpy_stub.StubLayout()
+        visible = list(context.window_manager.material_browser_rows)[:args.rows]
+
+        def draw_list():
+            layout = bpy_stub.StubLayout() if USING_STUB else None
+            for index, item in enumerate(visible):
+                ul.draw_item(context, layout, scene, item, 0, scene, "material_browser_index", index)
+
+        if USING_STUB:
+            bench("draw_panel", lambda: panel.draw(context), 1)
+            bench("draw_list_rows", draw_list, len(visible))
+        else:
+            print("[bench] draw benchmarks need a UI layout and only run under the stub", file=sys.stderr)
+
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "bpy": "stub" if USING_STUB else ".".join(map(str, bpy.app.version)),
+            "addon_version": ".".join(map(str, addon.bl_info["version"])),
+            "config": {
+                "files": args.files,
+                "materials_per_file": args.materials,
+                "previews": args.previews,
+                "preview_size": args.preview_size,
+                "preview_format": args.preview_format,
+                "repeat": args.repeat,
+                "seed": args.seed,
+                "latency_ms": args.latency_ms,
+            },
+        },
+        "results": results,
+        "memory": {"store_bytes": store_bytes},
+        "profile": profiler.stats() if args.profile else {},
+    }
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n{'benchmark':<28} {'before':>10} {'after':>10} {'ratio':>7}", file=sys.stderr)
+    for name, result in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        print(f"{name:<28} {old['median_ms']:10.3f} {result['median_ms']:10.3f} {ratio:7.2f}x",
+              file=sys.stderr)
+
+
+def parse_args(argv):
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    parser = argparse.ArgumentParser(description="TMG Material Browser benchmarks")
+    parser.add_argument("--files", type=int, default=8, help="Number of .blend libraries")
+    parser.add_argument("--materials", type=int, default=25, help="Materials per library")
+    parser.add_argument("--previews", type=int, default=None,
+                        help="Total preview images (default: one per material)")
+    parser.add_argument("--preview-size", type=int, default=128)
+    parser.add_argument("--preview-format", choices=["png", "jpg"], default="png")
+    parser.add_argument("--pack-thumbs", type=int, default=200,
+                        help="Rendered thumbnails in the pack for the render output benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=12, help="Visible list rows to draw")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--similar-rows", type=int, default=100000,
+                        help="Materials in the synthetic find-similar benchmark")
+    parser.add_argument("--library", help="Generate into this folder and keep it")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary library")
+    parser.add_argument("--latency-ms", type=float, default=1.0,
+                        help="Simulated per-call filesystem latency for the network scan benchmarks (0 skips them)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Also record the add-on's built-in timing sections")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    report = run(args)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
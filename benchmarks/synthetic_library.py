@@ -0,0 +1,154 @@
+# Synthetic material library generator for the benchmarks.
+#
+# Lays out a folder the way the browser expects it:
+#   <root>/Lib_000.blend
+#   <root>/Lib_000_Data/Lib_000.json
+#   <root>/Lib_000_Data/previews/<material>.png|.jpg
+#
+# Under the bpy stub the .blend files are placeholders and their material
+# names are handed back to the caller; inside Blender real .blend files are
+# written with bpy.data.libraries.write.
+
+import os
+import json
+import struct
+import random
+import zlib
+
+CACHE_SUFFIX = "_Data"
+PREVIEW_FOLDER = "previews"
+
+# Words that hit KEYWORD_CATEGORIES plus some that do not, so both the
+# categorised and the "Uncategorized" paths of get_category are exercised.
+CATEGORY_WORDS = [
+    "Wood", "Oak", "Concrete", "Brick", "Marble", "Granite", "Stone", "Slate",
+    "Metal", "Steel", "Rust", "Plastic", "Rubber", "Glass", "Ceramic", "Fabric",
+    "Leather", "Grass", "Moss", "Skin", "Tile", "Floor", "Wall", "Roof", "SciFi",
+    "Toon", "Mosaic", "Cheese", "Checker",
+]
+NEUTRAL_WORDS = [
+    "Worn", "Clean", "Dirty", "Painted", "Old", "New", "Rough", "Polished",
+    "Wet", "Dry", "Mossy", "Cracked", "Dark", "Light", "Blue", "Red",
+]
+UNCATEGORIZED_WORDS = ["Surface", "Material", "Shader", "Sample", "Variant"]
+
+
+def material_names(rng, count, file_index):
+    names = []
+    for i in range(count):
+        if rng.random() < 0.15:
+            subject = rng.choice(UNCATEGORIZED_WORDS)
+        else:
+            subject = rng.choice(CATEGORY_WORDS)
+        names.append(f"{rng.choice(NEUTRAL_WORDS)}_{subject}_{file_index:03d}_{i:04d}")
+    return names
+
+
+# ---------- Image writers ----------
+def _png_chunk(tag, data):
+    chunk = tag + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xFFFFFFFF)
+
+
+def png_bytes(width, height, color=(128, 128, 128, 255)):
+    # Horizontal gradient so the image does not compress down to nothing
+    r, g, b, a = color
+    row = bytearray()
+    for x in range(width):
+        shade = (x * 255) // max(1, width - 1)
+        row += bytes(((r + shade) // 2, (g + shade) // 2, (b + shade) // 2, a))
+    raw = b"".join(b"\x00" + bytes(row) for _ in range(height))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(raw, 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def jpeg_header_bytes(width, height):
+    # Header-only baseline JPEG (SOI, JFIF, SOF0, EOI). It carries the right
+    # dimensions for anything that reads headers, but has no scan data.
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof0 = struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x11\x00\x02\x11\x01\x03\x11\x01"
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe0" + struct.pack(">H", len(app0) + 2) + app0
+        + b"\xff\xc0" + struct.pack(">H", len(sof0) + 2) + sof0
+        + b"\xff\xd9"
+    )
+
+
+def _write_blend(bpy, blend_path, names):
+    if getattr(bpy, "__stub__", False):
+        with open(blend_path, "wb") as f:
+            f.write(b"BLENDER-v404")
+        bpy.data.libraries.contents[os.path.abspath(blend_path)] = list(names)
+        return
+
+    mats = set()
+    for name in names:
+        mat = bpy.data.materials.new(name)
+        mat.use_nodes = True
+        mats.add(mat)
+    bpy.data.libraries.write(blend_path, mats, fake_user=True)
+    for mat in mats:
+        bpy.data.materials.remove(mat)
+
+
+def generate_library(root, bpy, num_files=8, materials_per_file=25, num_previews=None,
+                     preview_size=128, preview_format="png", write_index=True, seed=0):
+    """Create a synthetic library under `root`.
+
+    `num_previews` defaults to one preview per material; it is spread evenly
+    over the files. Returns {blend_file: [material names]}.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+
+    total = num_files * materials_per_file
+    if num_previews is None:
+        num_previews = total
+    num_previews = min(num_previews, total)
+
+    preview_format = preview_format.lower()
+    ext = "jpg" if preview_format in {"jpg", "jpeg"} else "png"
+    if ext == "png":
+        image_data = png_bytes(preview_size, preview_size)
+    else:
+        image_data = jpeg_header_bytes(preview_size, preview_size)
+
+    library = {}
+    previews_left = num_previews
+    for file_index in range(num_files):
+        blend_file = f"Lib_{file_index:03d}.blend"
+        blend_name = os.path.splitext(blend_file)[0]
+        names = material_names(rng, materials_per_file, file_index)
+        library[blend_file] = names
+
+        _write_blend(bpy, os.path.join(root, blend_file), names)
+
+        cache_folder = os.path.join(root, blend_name + CACHE_SUFFIX)
+        preview_folder = os.path.join(cache_folder, PREVIEW_FOLDER)
+        os.makedirs(preview_folder, exist_ok=True)
+
+        files_left = num_files - file_index
+        count = min(len(names), -(-previews_left // files_left))
+        previews_left -= count
+        for name in names[:count]:
+            with open(os.path.join(preview_folder, f"{name}.{ext}"), "wb") as f:
+                f.write(image_data)
+
+        if write_index:
+            entries = [{
+                "name": name,
+                "category": "",
+                "preview": f"{name}.{ext}" if i < count else "",
+                "blend_file": blend_file,
+            } for i, name in enumerate(names)]
+            with open(os.path.join(cache_folder, f"{blend_name}.json"), "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2)
+
+    return library
@@ -0,0 +1,83 @@
+# Bitmap facet index over the material list.
+#
+# Each category keeps one Python int used as a bitset, bit i set when item i
+# belongs to it. Selecting several categories is an OR, combining with the
+# text search is an AND, and per-category counts are popcounts, so neither
+# switching category nor filling the dropdown has to rescan the items.
+
+# Set bit positions of every byte value, for turning masks back into ids
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def mask_from_ids(ids, size):
+    bits = bytearray((size + 7) // 8)
+    for item_id in ids:
+        bits[item_id >> 3] |= 1 << (item_id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def ids_from_mask(mask, size):
+    """Item ids set in `mask`, ascending."""
+    ids = []
+    data = mask.to_bytes((size + 7) // 8, "little")
+    for byte_index, value in enumerate(data):
+        if value:
+            base = byte_index << 3
+            ids.extend(base + bit for bit in _BYTE_BITS[value])
+    return ids
+
+
+class FacetIndex:
+    def __init__(self, categories):
+        """`categories` holds the category of every item, by item id."""
+        self.size = len(categories)
+        self.all = (1 << self.size) - 1
+
+        members = {}
+        code_of = {}
+        # Small per-item category code, for per-id membership tests
+        self.codes = []
+        self.names = []
+        for item_id, category in enumerate(categories):
+            code = code_of.get(category)
+            if code is None:
+                code = code_of[category] = len(self.names)
+                self.names.append(category)
+                members[category] = []
+            members[category].append(item_id)
+            self.codes.append(code)
+
+        self.bits = {category: mask_from_ids(ids, self.size) for category, ids in members.items()}
+        self.totals = {category: len(ids) for category, ids in members.items()}
+
+    def __len__(self):
+        return self.size
+
+    def mask(self, categories):
+        """Union of the given categories; no categories means everything."""
+        if not categories:
+            return self.all
+        mask = 0
+        for category in categories:
+            mask |= self.bits.get(category, 0)
+        return mask
+
+    def counts(self, within=None):
+        """Items per category, optionally only those also set in `within`."""
+        if within is None or within == self.all:
+            return dict(self.totals)
+        return {category: (bits & within).bit_count() for category, bits in self.bits.items()}
+
+    def member_test(self, categories):
+        """Fast per-id check for callers that can't work on whole masks."""
+        if not categories:
+            return None
+        wanted = {code for code, name in enumerate(self.names) if name in categories}
+        codes = self.codes
+        return lambda item_id: codes[item_id] in wanted
+
+    def ids(self, mask):
+        return ids_from_mask(mask, self.size)
+
+    def from_ids(self, ids):
+        return mask_from_ids(ids, self.size)
@@ -0,0 +1,110 @@
+# Batched filesystem queries for libraries on slow or network filesystems.
+#
+# On NFS/SMB every stat or existence check is a network round trip. With
+# batching enabled each directory is listed once with os.scandir, and
+# existence, type, size and mtime questions about its files are answered
+# from that listing until it expires, so the number of round trips follows
+# the number of directories instead of the number of materials. Sizes and
+# mtimes come from DirEntry.stat(), which is free on Windows and cached per
+# entry elsewhere. With batching off every call goes straight to os.
+# Kept free of bpy.
+
+import os
+import time
+import threading
+
+LISTING_TTL = 2.0
+
+
+class DirectoryCache:
+    def __init__(self, ttl=LISTING_TTL, enabled=False):
+        self.ttl = ttl
+        self.enabled = enabled
+        # normalized folder -> (expiry, {normcased name: DirEntry} or None)
+        self.listings = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _listing(self, folder):
+        key = self._key(folder)
+        now = time.monotonic()
+        with self._lock:
+            cached = self.listings.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        try:
+            with os.scandir(folder) as it:
+                entries = {os.path.normcase(entry.name): entry for entry in it}
+        except OSError:
+            entries = None
+
+        with self._lock:
+            self.listings[key] = (now + self.ttl, entries)
+        return entries
+
+    def _entry(self, path):
+        folder, name = os.path.split(os.path.abspath(path))
+        listing = self._listing(folder)
+        if not listing:
+            return None
+        return listing.get(os.path.normcase(name))
+
+    def invalidate(self, folder=None):
+        """Forget one folder's listing (after writing into it) or all of them."""
+        with self._lock:
+            if folder is None:
+                self.listings.clear()
+            else:
+                self.listings.pop(self._key(folder), None)
+
+    # ---------- os / os.path equivalents ----------
+    def listdir(self, folder):
+        if not self.enabled:
+            return os.listdir(folder)
+        listing = self._listing(folder)
+        if listing is None:
+            raise FileNotFoundError(f"No such directory: '{folder}'")
+        return [entry.name for entry in listing.values()]
+
+    def exists(self, path):
+        if not self.enabled:
+            return os.path.exists(path)
+        return self._entry(path) is not None
+
+    def isdir(self, path):
+        if not self.enabled:
+            return os.path.isdir(path)
+        entry = self._entry(path)
+        if entry is None:
+            # A filesystem root has no parent listing to be found in
+            return os.path.dirname(os.path.abspath(path)) == os.path.abspath(path) and os.path.isdir(path)
+        return entry.is_dir()
+
+    def isfile(self, path):
+        if not self.enabled:
+            return os.path.isfile(path)
+        entry = self._entry(path)
+        return entry is not None and entry.is_file()
+
+    def getsize(self, path):
+        if not self.enabled:
+            return os.path.getsize(path)
+        entry = self._entry(path)
+        if entry is None:
+            raise FileNotFoundError(f"No such file: '{path}'")
+        return entry.stat().st_size
+
+    def mtime_ns(self, path):
+        if not self.enabled:
+            return os.stat(path).st_mtime_ns
+        entry = self._entry(path)
+        if entry is None:
+            raise FileNotFoundError(f"No such file: '{path}'")
+        return entry.stat().st_mtime_ns
+
+
+FS = DirectoryCache()
@@ -0,0 +1,160 @@
+# Read image dimensions from file headers without decoding pixels.
+#
+# Used at index time to estimate how much memory a material's textures will
+# take once appended. Only the first few KB of each file are read.
+
+import os
+import struct
+
+HEADER_READ = 64 * 1024
+
+
+def _png(data):
+    if len(data) < 26 or data[12:16] != b"IHDR":
+        return None
+    width, height, depth, color_type = struct.unpack(">IIBB", data[16:26])
+    channels = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}.get(color_type, 4)
+    return width, height, channels, depth > 8
+
+
+def _jpeg(data):
+    position = 2
+    while position + 9 < len(data):
+        if data[position] != 0xFF:
+            position += 1
+            continue
+        marker = data[position + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            position += 2
+            continue
+        length = struct.unpack(">H", data[position + 2:position + 4])[0]
+        # SOF0..SOF15, excluding DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            depth, height, width, channels = struct.unpack(">BHHB", data[position + 4:position + 10])
+            return width, height, channels, depth > 8
+        position += 2 + length
+    return None
+
+
+def _bmp(data):
+    if len(data) < 30:
+        return None
+    width, height = struct.unpack("<ii", data[18:26])
+    bits = struct.unpack("<H", data[28:30])[0]
+    return abs(width), abs(height), 4 if bits == 32 else 3, False
+
+
+def _tga(data):
+    if len(data) < 18:
+        return None
+    width, height, bits = struct.unpack("<HHB", data[12:17])
+    return width, height, 4 if bits == 32 else 3, False
+
+
+def _hdr(data):
+    for line in data.split(b"\n")[1:64]:
+        parts = line.split()
+        if len(parts) == 4 and parts[0] in (b"-Y", b"+Y") and parts[2] in (b"+X", b"-X"):
+            return int(parts[3]), int(parts[1]), 3, True
+    return None
+
+
+def _exr_channel_count(value):
+    # name\0 followed by 16 bytes of pixel type / sampling, list ends with \0
+    count = 0
+    position = 0
+    while position < len(value) and value[position] != 0:
+        position = value.find(b"\0", position) + 1 + 16
+        count += 1
+    return count
+
+
+def _exr(data):
+    # Attribute list: name\0 type\0 size(int32) value; ends with an empty name
+    position = 8
+    channels = 0
+    while position < len(data):
+        end = data.find(b"\0", position)
+        if end <= position:
+            break
+        name = data[position:end]
+        type_end = data.find(b"\0", end + 1)
+        size = struct.unpack("<i", data[type_end + 1:type_end + 5])[0]
+        value = data[type_end + 5:type_end + 5 + size]
+        if name == b"channels":
+            channels = _exr_channel_count(value)
+        elif name == b"dataWindow" and len(value) == 16:
+            xmin, ymin, xmax, ymax = struct.unpack("<iiii", value)
+            return xmax - xmin + 1, ymax - ymin + 1, min(4, channels or 4), True
+        position = type_end + 5 + size
+    return None
+
+
+def _tiff(data):
+    endian = "<" if data[:2] == b"II" else ">"
+    offset = struct.unpack(endian + "I", data[4:8])[0]
+    if offset + 2 > len(data):
+        return None
+    count = struct.unpack(endian + "H", data[offset:offset + 2])[0]
+    tags = {}
+    for i in range(count):
+        entry = data[offset + 2 + i * 12:offset + 14 + i * 12]
+        if len(entry) < 12:
+            break
+        tag, kind = struct.unpack(endian + "HH", entry[:4])
+        if kind == 3:
+            value = struct.unpack(endian + "H", entry[8:10])[0]
+        else:
+            value = struct.unpack(endian + "I", entry[8:12])[0]
+        tags[tag] = value
+    if 256 not in tags or 257 not in tags:
+        return None
+    # BitsPerSample points at an array when there are several samples; treat
+    # anything that is not a plain 8 as high bit depth.
+    return tags[256], tags[257], tags.get(277, 1), tags.get(258, 8) > 8
+
+
+def _reader_for(data):
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _png
+    if data.startswith(b"\xff\xd8"):
+        return _jpeg
+    if data.startswith(b"BM"):
+        return _bmp
+    if data.startswith(b"#?RADIANCE") or data.startswith(b"#?RGBE"):
+        return _hdr
+    if data.startswith(b"\x76\x2f\x31\x01"):
+        return _exr
+    if data[:4] in (b"II*\0", b"MM\0*"):
+        return _tiff
+    return None
+
+
+def read_image_info(path):
+    """Return (width, height, channels, is_float) for `path`, or None."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(HEADER_READ)
+    except OSError:
+        return None
+
+    reader = _reader_for(data)
+    if reader is None and os.path.splitext(path)[1].lower() == ".tga":
+        reader = _tga
+    if reader is None:
+        return None
+
+    try:
+        return reader(data)
+    except (struct.error, ValueError, IndexError):
+        return None
+
+
+def estimate_image_memory(width, height, is_float):
+    """Estimated (ram_bytes, vram_bytes) once Blender has loaded the image.
+
+    Blender keeps byte images as 8-bit RGBA and float images as 32-bit RGBA;
+    the GPU copy adds roughly a third for the mip chain.
+    """
+    ram = width * height * (16 if is_float else 4)
+    return ram, ram * 4 // 3
@@ -0,0 +1,209 @@
+import bpy
+import os
+from collections import Counter
+
+from .image_headers import read_image_info, estimate_image_memory
+from .fsio import FS
+from .mirror_cache import MIRROR
+from .similarity import material_features
+
+IMAGE_NODE_TYPES = {'TEX_IMAGE', 'TEX_ENVIRONMENT'}
+
+
+def walk_node_tree(tree, images, seen_groups, type_counts=None):
+    count = 0
+    for node in tree.nodes:
+        count += 1
+        if type_counts is not None:
+            type_counts[node.type] += 1
+        if node.type in IMAGE_NODE_TYPES and getattr(node, "image", None):
+            images.add(node.image)
+        elif node.type == 'GROUP' and node.node_tree and node.node_tree.name not in seen_groups:
+            seen_groups.add(node.node_tree.name)
+            count += walk_node_tree(node.node_tree, images, seen_groups, type_counts)
+    return count
+
+
+def library_image_path(image):
+    # Relative paths resolve against the library, which may be the local
+    # mirror copy; textures are only ever read from the library folder
+    path = os.path.normpath(bpy.path.abspath(image.filepath, library=image.library))
+    return MIRROR.canonical(path)
+
+
+def describe_image(image):
+    # Reads only what is stored in the .blend; touching image.size or pixels
+    # would decode the image. Files on disk are measured by measure_images().
+    if image.packed_file:
+        return {"path": "", "name": image.name, "file_size": image.packed_file.size,
+                "width": 0, "height": 0, "is_float": False}
+    return {"path": library_image_path(image), "name": image.name, "source": image.source,
+            "file_size": 0, "width": 0, "height": 0, "is_float": False}
+
+
+def measure_images(costs):
+    """Fill in the size and dimensions of every texture file in `costs` (cost
+    dicts) and redo their totals.
+
+    Only stats files and reads their headers, which can be slow on a network
+    share, so the refresh does it on its worker thread, not in a UI tick.
+    """
+    measured = {}
+    for cost in costs:
+        for info in cost["images"]:
+            path = info["path"]
+            if not path:
+                continue
+            known = measured.get(path)
+            if known is None:
+                try:
+                    file_size = FS.getsize(path)
+                except OSError:
+                    file_size = 0
+                header = read_image_info(path) if info.get("source", 'FILE') == 'FILE' else None
+                width, height, channels, is_float = header or (0, 0, 0, False)
+                known = measured[path] = {"file_size": file_size, "width": width,
+                                          "height": height, "is_float": is_float}
+            info.update(known)
+        cost.update(summarize_cost(cost["node_count"], cost["images"]))
+
+
+BASE_COLOR_HINTS = ("basecolor", "base_color", "base color", "albedo", "diffuse", "diff", "color", "col")
+# How many nodes upstream of Base Color to search for the texture
+BASE_COLOR_DEPTH = 4
+
+
+def upstream_image(socket, depth=BASE_COLOR_DEPTH):
+    # Follow links through color ramps, mix and hue nodes to the first image
+    for link in socket.links:
+        node = link.from_node
+        if node.type == 'TEX_IMAGE' and node.image:
+            return node.image
+        if depth > 1:
+            for node_input in node.inputs:
+                if node_input.is_linked:
+                    image = upstream_image(node_input, depth - 1)
+                    if image:
+                        return image
+    return None
+
+
+def image_file_path(image):
+    if image.packed_file or image.source != 'FILE':
+        return ""
+    return library_image_path(image)
+
+
+def find_base_color(mat, images):
+    """Where a swatch for `mat` should come from: {"image": path, "color": rgb}."""
+    color = list(getattr(mat, "diffuse_color", (0.8, 0.8, 0.8, 1.0)))[:3]
+    image = None
+
+    tree = mat.node_tree if mat.use_nodes else None
+    if tree:
+        for node in tree.nodes:
+            if node.type != 'BSDF_PRINCIPLED':
+                continue
+            socket = node.inputs.get("Base Color")
+            if socket is None:
+                continue
+            if socket.is_linked:
+                image = upstream_image(socket)
+            else:
+                color = list(socket.default_value)[:3]
+            break
+
+        if image is None:
+            for candidate in images:
+                name = (candidate.name + " " + os.path.basename(candidate.filepath)).lower()
+                if any(hint in name for hint in BASE_COLOR_HINTS):
+                    image = candidate
+                    break
+
+    return {"image": image_file_path(image) if image else "", "color": [round(c, 4) for c in color]}
+
+
+def principled_inputs(mat):
+    """{input name: (constant value or None, linked)} of the first Principled BSDF."""
+    tree = mat.node_tree if mat.use_nodes else None
+    if not tree:
+        return {}
+    for node in tree.nodes:
+        if node.type != 'BSDF_PRINCIPLED':
+            continue
+        values = {}
+        for node_input in node.inputs:
+            value = getattr(node_input, "default_value", None)
+            if not isinstance(value, (int, float)):
+                value = None
+            values[node_input.name] = (value, node_input.is_linked)
+        return values
+    return {}
+
+
+def summarize_cost(node_count, image_infos):
+    file_bytes = 0
+    ram_bytes = 0
+    vram_bytes = 0
+    for info in image_infos:
+        file_bytes += info["file_size"]
+        if info["width"] and info["height"]:
+            ram, vram = estimate_image_memory(info["width"], info["height"], info["is_float"])
+        else:
+            # Unknown dimensions: assume it decodes to about 4x its file size
+            ram = vram = info["file_size"] * 4
+        ram_bytes += ram
+        vram_bytes += vram
+
+    return {
+        "node_count": node_count,
+        "images": image_infos,
+        "texture_bytes": file_bytes,
+        "ram_bytes": ram_bytes,
+        "vram_bytes": vram_bytes,
+    }
+
+
+def collect_material_costs(filepath, material_names):
+    """Link `material_names` into a throwaway Main and measure each one.
+
+    Returns {material name: cost dict}. Nothing is added to the open file.
+    Texture files are not touched; see measure_images().
+    """
+    costs = {}
+    if not material_names or not hasattr(bpy.data, "temp_data"):
+        return costs
+
+    try:
+        with bpy.data.temp_data(filepath=filepath) as temp_data:
+            with temp_data.libraries.load(filepath, link=True) as (data_from, data_to):
+                data_to.materials = list(material_names)
+
+            for mat in data_to.materials:
+                if mat is None:
+                    continue
+                images = set()
+                type_counts = Counter()
+                node_count = 0
+                if mat.use_nodes and mat.node_tree:
+                    node_count = walk_node_tree(mat.node_tree, images, set(), type_counts)
+                infos = [describe_image(image) for image in images]
+                cost = costs[mat.name] = summarize_cost(node_count, infos)
+                cost["base_color"] = find_base_color(mat, images)
+                # For "find similar"; see similarity.py
+                cost["features"] = material_features(type_counts, principled_inputs(mat),
+                                                     cost["base_color"]["color"])
+    except Exception as e:
+        print(f"[MaterialBrowser] Failed to collect material costs from {filepath}: {e}")
+
+    return costs
+
+
+def format_bytes(num_bytes):
+    if num_bytes >= 1024 ** 3:
+        return f"{num_bytes / 1024 ** 3:.1f} GB"
+    if num_bytes >= 1024 ** 2:
+        return f"{num_bytes / 1024 ** 2:.0f} MB"
+    if num_bytes >= 1024:
+        return f"{num_bytes / 1024:.0f} KB"
+    return f"{num_bytes} B"
@@ -1,15 +1,48 @@
 import bpy
 import os
+import re
 import gc
 import json
 import bpy.utils.previews
 
+import numpy as np
+
 from bpy.app.handlers import persistent
 from bpy.types import Panel, Operator, PropertyGroup, UIList
-from bpy.props import StringProperty, CollectionProperty, IntProperty, BoolProperty, PointerProperty
+from bpy.props import StringProperty, CollectionProperty, IntProperty, BoolProperty, PointerProperty, EnumProperty
+
+from .profiling import PROFILER, profiled
+from .search import SearchIndex
+from .facets import FacetIndex
+from .material_store import MaterialStore
+from .similarity import SimilarityIndex, FEATURE_DIM, COLOR_DIM, flat_histograms
+from .fsio import FS
+from .mirror_cache import MIRROR
+from .prefetch import PREFETCHER
+from .material_costs import collect_material_costs, format_bytes
+from .refresh_job import start_refresh, get_job, cancel_job, cancel_all_jobs
+from .thumb_store import (
+    load_manifest, store_path, manifest_path,
+    atomic_write, file_lock, pack_path, read_pack, PACK_EXT
+)
 
 # ---------- CONFIG ----------
 preview_collections = {}
+search_cache = {}
+# (blend file name, material name) -> thumbnail hash in the preview collection
+preview_keys = {}
+# manifest path -> mtime when it was last loaded into the preview collection
+manifest_mtimes = {}
+# Every indexed material; the list UI only holds ids into it
+material_store = MaterialStore(feature_dim=FEATURE_DIM)
+# thumbnail hash -> color histogram from its manifest entry
+thumb_colors = {}
+# blend file -> (index mtime or None, generation) as last loaded
+index_state = {}
+# Seconds between checks for indexes rewritten by other clients
+INDEX_POLL_INTERVAL = 10.0
+# Bumped when index entries gain fields, e.g. 2 added the similarity features
+INDEX_VERSION = 2
 
 CACHE_SUFFIX = "_Data"
 JSON_NAME = "{}.json"
@@ -86,8 +119,21 @@ KEYWORD_CATEGORIES = {
 @persistent
 def load_previews_on_start(dummy):
     context = bpy.context
-    load_all_previews(context)
-
+    cancel_all_jobs()
+    PROFILER.enabled = PROFILER.enabled or getattr(context.scene, "material_browser_profiling", False)
+    FS.enabled = getattr(context.scene, "material_browser_batched_io", False)
+    FS.invalidate()
+    configure_mirror(context.scene)
+
+    # The index isn't saved with the .blend, so rebuild it from the folder
+    material_store.clear()
+    set_list_rows([])
+    path = getattr(context.scene, "material_browser_path", "")
+    folder_path = bpy.path.abspath(path) if path else ""
+    if folder_path and FS.isdir(folder_path):
+        start_refresh(context.scene, folder_path, force=False)
+
+@profiled("parse_blend_file", count=lambda mats, filepath: len(mats))
 def parse_blend_file(filepath):
     materials = []
 
@@ -96,49 +142,133 @@ def parse_blend_file(filepath):
     blend_name = os.path.splitext(blend_file)[0]
     preview_folder = os.path.join(blend_dir, f"{blend_name}_Data", PREVIEW_FOLDER)
 
-    with bpy.data.libraries.load(filepath, link=False) as (data_from, data_to):
-        for mat_name in data_from.materials:
-            if not mat_name or mat_name.strip() == "":
-                continue
+    # Read from the local mirror copy when there is one
+    source_path = MIRROR.fetch(filepath)
+    with bpy.data.libraries.load(source_path, link=False) as (data_from, data_to):
+        material_names = [name for name in data_from.materials if name and name.strip() != ""]
 
-            preview_filename = f"{mat_name}.png"
-            preview_path = os.path.join(preview_folder, preview_filename)
-            preview = preview_filename if os.path.exists(preview_path) else ""
+    costs = collect_material_costs(source_path, material_names)
 
-            materials.append({
-                "name": mat_name.strip(),
-                "category": get_category(mat_name),
-                "preview": preview,
-                "blend_file": blend_file
-            })
+    for mat_name in material_names:
+        preview_filename = f"{mat_name}.png"
+        preview_path = os.path.join(preview_folder, preview_filename)
+        preview = preview_filename if FS.exists(preview_path) else ""
+
+        entry = {
+            "name": mat_name.strip(),
+            "category": get_category(mat_name),
+            "preview": preview,
+            "blend_file": blend_file
+        }
+        if mat_name in costs:
+            entry["cost"] = costs[mat_name]
+        materials.append(entry)
 
     return materials
 
 
 def write_json(json_path, data):
-    os.makedirs(os.path.dirname(json_path), exist_ok=True)
+    # Written aside and renamed into place, so readers on other machines
+    # never see a half-written file
     try:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
+        atomic_write(json_path, json.dumps(data, indent=2).encode("utf-8"))
     except Exception as e:
         print(f"Failed to write JSON file at {json_path}: {e}")
+    FS.invalidate(os.path.dirname(json_path))
 
 
 def read_json(json_path):
-    if not os.path.exists(json_path):
+    # Just open it: an existence check and a size check first would be two
+    # more round trips on a network share
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return []
+    except OSError as e:
+        print(f"Failed to read JSON file at {json_path}: {e}")
         return []
 
-    if os.path.getsize(json_path) == 0:
+    if not text:
         print(f"Warning: JSON file at {json_path} is empty.")
         return []
 
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return json.loads(text)
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON file at {json_path}: {e}")
         return []
 
+# ---------- Shared index ----------
+# An index file records the size and mtime of the .blend it was built from
+# and a generation that goes up with every write, so a library indexed by
+# one artist is reused by everyone else until the .blend changes.
+def index_path(folder_path, blend_file):
+    blend_name = os.path.splitext(blend_file)[0]
+    return os.path.join(folder_path, blend_name + CACHE_SUFFIX, JSON_NAME.format(blend_name))
+
+def blend_stamp(blend_path):
+    try:
+        return [FS.getsize(blend_path), FS.mtime_ns(blend_path)]
+    except OSError:
+        return None
+
+def read_index(json_path):
+    """(entries, generation, source stamp); older plain-list indexes have neither.
+
+    The stamp is None for an index of another INDEX_VERSION, so it gets
+    re-parsed even though its .blend is unchanged.
+    """
+    data = read_json(json_path)
+    if isinstance(data, dict):
+        source = data.get("source") if data.get("version") == INDEX_VERSION else None
+        return data.get("materials", []), data.get("generation", 0), source
+    return data, 0, None
+
+def write_index(json_path, entries, source):
+    """Write an index unless someone else already indexed the same .blend.
+
+    Returns the (entries, generation) now on disk.
+    """
+    generation = 0
+    try:
+        with file_lock(json_path):
+            current, generation, current_source = read_index(json_path)
+            if source is not None and current_source == source:
+                return current, generation
+            generation += 1
+            write_json(json_path, {"version": INDEX_VERSION, "generation": generation, "source": source,
+                                   "materials": entries})
+    except OSError as e:
+        print(f"[MaterialBrowser] Failed to lock {json_path}: {e}")
+    return entries, generation
+
+def changed_indexes(folder_path):
+    """Libraries whose index another client rewrote since it was loaded."""
+    changed = []
+    for blend_file, (mtime, generation) in list(index_state.items()):
+        json_path = index_path(folder_path, blend_file)
+        try:
+            current_mtime = FS.mtime_ns(json_path)
+        except OSError:
+            continue
+        if current_mtime == mtime:
+            continue
+        _, current_generation, _ = read_index(json_path)
+        index_state[blend_file] = (current_mtime, generation)
+        if current_generation != generation:
+            changed.append(blend_file)
+    return changed
+
+def watch_index_timer():
+    scene = bpy.context.scene
+    job = get_job(scene)
+    folder_path = material_store.folder
+    if folder_path and not (job and not job.finished) and changed_indexes(folder_path):
+        print("[MaterialBrowser] Library index changed by another client, reloading")
+        start_refresh(scene, folder_path, force=False)
+    return INDEX_POLL_INTERVAL
+
 # ---------- CORE UTILS ----------
 def clear_preview_collection():
     if "material_thumbs" in preview_collections:
@@ -146,63 +276,149 @@ def clear_preview_collection():
         del preview_collections["material_thumbs"]
     gc.collect()
 
-def load_all_previews(context):
-    path = getattr(context.scene, "material_browser_path", None)
-    if not path:
-        print("No material path set, skipping preview load.")
-        return
-    
-    clear_preview_collection()
-    pcoll = bpy.utils.previews.new()
-    preview_collections["material_thumbs"] = pcoll
-
-    folder_path = bpy.path.abspath(context.scene.material_browser_path)
-    if not os.path.isdir(folder_path):
-        print(f"[MaterialBrowser] Invalid path: {folder_path}")
+@profiled("load_manifest_previews", count=lambda result, pcoll, folder_path, blend_file, manifest: len(manifest["materials"]))
+def load_manifest_previews(pcoll, folder_path, blend_file, manifest):
+    packed = set()
+    for name, entry in manifest["materials"].items():
+        digest = entry["hash"]
+        preview_keys[(blend_file, name)] = digest
+        if "colors" in entry:
+            thumb_colors[digest] = entry["colors"]
+
+        # Identical thumbnails share one hash and are only loaded once
+        if digest in pcoll:
+            continue
+        if entry["ext"] == PACK_EXT:
+            packed.add(digest)
+            continue
+        # Thumbnails are content-addressed, so a mirrored copy never goes stale
+        full_path = MIRROR.fetch(store_path(folder_path, digest, entry["ext"]), immutable=True)
+        try:
+            pcoll.load(digest, full_path, 'IMAGE')
+        except Exception as e:
+            print(f"[MaterialBrowser] Failed to load preview {full_path}: {e}")
+
+    if packed:
+        load_packed_previews(pcoll, folder_path, blend_file, packed)
+
+def load_packed_previews(pcoll, folder_path, blend_file, digests):
+    # Rendered pixels go straight into the previews, no image file is decoded
+    full_path = MIRROR.fetch(pack_path(folder_path, blend_file), append_only=True)
+    try:
+        records = read_pack(full_path, digests)
+    except Exception as e:
+        print(f"[MaterialBrowser] Failed to read thumbnail pack {full_path}: {e}")
         return
 
-    blend_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".blend")]
+    for digest, (width, height, rgba) in records.items():
+        preview = pcoll.new(digest)
+        preview.image_size = (width, height)
+        preview.image_pixels.foreach_set(np.frombuffer(rgba, dtype=np.int32))
 
-    for blend_file in blend_files:
-        preview_folder = os.path.join(
-            folder_path,
-            blend_file.replace(".blend", CACHE_SUFFIX),
-            PREVIEW_FOLDER
-        )
+def reload_changed_previews(context):
+    # Load thumbnails from manifests rewritten since the last look, e.g. when
+    # the renderer replaces drafts. Returns the number of manifests reloaded.
+    pcoll = preview_collections.get("material_thumbs")
+    folder_path = bpy.path.abspath(context.scene.material_browser_path)
+    if pcoll is None or not FS.isdir(folder_path):
+        return 0
 
-        if not os.path.isdir(preview_folder):
+    changed = 0
+    for blend_file in FS.listdir(folder_path):
+        if not blend_file.lower().endswith(".blend"):
             continue
+        path = manifest_path(folder_path, blend_file)
+        try:
+            mtime = FS.mtime_ns(path)
+        except OSError:
+            continue
+        if manifest_mtimes.get(path) == mtime:
+            continue
+        manifest_mtimes[path] = mtime
+        load_manifest_previews(pcoll, folder_path, blend_file, load_manifest(folder_path, blend_file))
+        changed += 1
+    return changed
+
+def get_preview_icon_id(pcoll, record):
+    digest = preview_keys.get((record.library_name, record.name))
+    if pcoll and digest and digest in pcoll:
+        return pcoll[digest].icon_id
+    return 0
+
+def get_search_index(scn):
+    # Extended with the rows a refresh added since the last search instead
+    # of being rebuilt for every batch
+    index = search_cache.get("index")
+    if index is None or len(index) > len(material_store):
+        index = search_cache["index"] = SearchIndex()
+    if len(index) < len(material_store):
+        index.add(material_store.names[len(index):])
+    return index
+
+def get_facet_index(scn):
+    facets = search_cache.get("facets")
+    if facets is None or len(facets) != len(material_store):
+        facets = FacetIndex(material_store.category_names())
+        search_cache["facets"] = facets
+        # Lower-cased names for the substring filter
+        search_cache["names"] = [name.lower() for name in material_store.names]
+        search_cache["text_mask"] = None
+    return facets
+
+def get_similarity_index():
+    key = (len(material_store), len(thumb_colors))
+    cached = search_cache.get("similarity")
+    if cached and cached[0] == key:
+        return cached[1]
+
+    count = len(material_store)
+    # A copy: a live view would stop the store's arrays from growing
+    features = np.frombuffer(material_store.features, dtype=np.float32).reshape(count, FEATURE_DIM).copy()
+    colors = flat_histograms(features)
+    libraries = material_store.libraries
+    for i, (name, code) in enumerate(zip(material_store.names, material_store.library)):
+        histogram = thumb_colors.get(preview_keys.get((libraries[code], name)))
+        if histogram and len(histogram) == COLOR_DIM:
+            colors[i] = histogram
+
+    index = SimilarityIndex(features, colors)
+    search_cache["similarity"] = (key, index)
+    return index
+
+def find_record_id(library_name, name):
+    libraries = material_store.libraries
+    for i, (item_name, code) in enumerate(zip(material_store.names, material_store.library)):
+        if item_name == name and libraries[code] == library_name:
+            return i
+    return -1
+
+def get_list_rows():
+    return bpy.context.window_manager.material_browser_rows
+
+def set_list_rows(item_ids):
+    # Rows only carry a store id, so they can be filled in one bulk write
+    rows = get_list_rows()
+    # Surplus rows come off the end, so a shrinking list keeps the rest
+    for index in range(len(rows) - 1, len(item_ids) - 1, -1):
+        rows.remove(index)
+    while len(rows) < len(item_ids):
+        rows.add()
+    rows.foreach_set("store_id", item_ids)
+
+def get_active_record(scn):
+    rows = get_list_rows()
+    index = scn.material_browser_index
+    if 0 <= index < len(rows):
+        return material_store.record(rows[index].store_id)
+    return None
 
-        for fname in os.listdir(preview_folder):
-            if fname.lower().endswith(".png") or fname.lower().endswith(".jpg"):
-                full_path = os.path.join(preview_folder, fname)
-                name_key = os.path.splitext(fname)[0]
-
-                if name_key not in pcoll:
-                    try:
-                        pcoll.load(name_key, full_path, 'IMAGE')
-                    except Exception as e:
-                        print(f"[MaterialBrowser] Failed to load preview {full_path}: {e}")
-
-def refresh_material_list(context, material_data_list, blend_file=""):
-    items = context.scene.material_browser_items
-    items.clear()
-
-    for entry in material_data_list:
-        item = items.add()
-        item.name = entry.get("name", "Unnamed")
-        item.category = get_category(item.name)
-        item.preview_path = os.path.join(
-            context.scene.material_browser_path,
-            entry["blend_file"].replace(".blend", CACHE_SUFFIX),
-            PREVIEW_FOLDER,
-            f"{item.name}.png"
-        )
-        item.blend_file = os.path.join(context.scene.material_browser_path, entry["blend_file"])
-
-    context.scene.material_browser_material_count = f"Materials: {len(context.scene.material_browser_items)}"
-    context.scene.material_browser_material_category_count = f"Materials: {len(context.scene.material_browser_filtered_items)}"
-    update_material_browser_filter(None, context)
+def add_material_items(scene, material_data_list):
+    # The search index only grows, so it is kept
+    index = search_cache.get("index")
+    search_cache.clear()
+    if index is not None:
+        search_cache["index"] = index
+    material_store.add(material_data_list, get_category)
 
 def find_height_texture(mat):
     if not mat or not mat.use_nodes:
@@ -250,25 +466,108 @@ def disconnect_displacement(mat, context, enable_displacement):
                         for link in disp_input.links:
                             mat.node_tree.links.remove(link)
 
-def filter_material_browser_items(scn):
-    scn.material_browser_filtered_items.clear()
+# Sort key columns of the store, and whether they sort descending
+MATERIAL_SORT_KEYS = {
+    "NAME": (lambda store: search_cache["names"], False),
+    "MEMORY": (lambda store: store.ram_bytes, True),
+    "NODES": (lambda store: store.node_count, True),
+}
+
+@profiled("filter_material_browser_items", count=lambda result, scn, **_: len(material_store))
+def filter_material_browser_items(scn, keep_selection=False):
+    # `keep_selection` keeps the selected material selected, e.g. while a
+    # refresh adds rows; a changed filter starts over at the first row
+    selected = get_active_record(scn) if keep_selection else None
     filter_text = scn.material_browser_filter.lower()
-    selected_category = scn.material_browser_category
+    selected_categories = scn.material_browser_category
+
+    facets = get_facet_index(scn)
+
+    similar_to = getattr(scn, "material_browser_similar_to", "")
+    source_id = find_record_id(*similar_to.split("\t", 1)) if "\t" in similar_to else -1
+
+    if source_id >= 0:
+        # Ranked by similarity to the chosen material, which comes first
+        allowed = None
+        if selected_categories:
+            allowed = np.zeros(len(material_store), dtype=bool)
+            allowed[facets.ids(facets.mask(selected_categories))] = True
+        ids, _ = get_similarity_index().query([source_id], scn.material_browser_max_results, allowed)
+        item_ids = [source_id] + ids[0]
+        search_cache["text_mask"] = None
+    elif scn.material_browser_search_mode == 'FUZZY' and filter_text:
+        # Ranked results keep their order, so categories are checked per id
+        allowed = facets.member_test(selected_categories)
+        item_ids = get_search_index(scn).search(filter_text, scn.material_browser_max_results, allowed)
+        search_cache["text_mask"] = None
+    else:
+        text_mask = None
+        if filter_text:
+            names = search_cache["names"]
+            text_mask = facets.from_ids([i for i, name in enumerate(names) if filter_text in name])
+        # Category counts in the dropdown follow the text search
+        search_cache["text_mask"] = text_mask
+
+        mask = facets.mask(selected_categories)
+        if text_mask is not None:
+            mask &= text_mask
+        item_ids = facets.ids(mask)
+
+    max_memory = scn.material_browser_max_memory
+    if max_memory > 0:
+        limit = max_memory * 1024 ** 2
+        has_cost, ram_bytes = material_store.has_cost, material_store.ram_bytes
+        item_ids = [i for i in item_ids if not has_cost[i] or ram_bytes[i] <= limit]
+
+    sort_key = MATERIAL_SORT_KEYS.get(scn.material_browser_sort)
+    if sort_key:
+        column, reverse = sort_key
+        values = column(material_store)
+        item_ids = sorted(item_ids, key=values.__getitem__, reverse=reverse)
+
+    set_list_rows(item_ids)
+
+    scn.material_browser_material_count = f"Materials: {len(material_store)}"
+    scn.material_browser_material_category_count = f"Materials: {len(item_ids)}"
+
+    if selected is not None:
+        try:
+            index = item_ids.index(selected.id)
+        except ValueError:
+            index = 0
+        if index != scn.material_browser_index:
+            scn.material_browser_index = index
+    elif item_ids:
+        scn.material_browser_index = 0
 
-    for item in scn.material_browser_items:
-        if selected_category in {"All", item.category}:
-            if filter_text in item.name.lower():
-                new_item = scn.material_browser_filtered_items.add()
-                new_item.name = item.name
-                new_item.category = item.category
-                new_item.blend_file = item.blend_file
-                new_item.preview_path = item.preview_path if item.preview_path else ""
+def update_material_browser_index(self, context):
+    prefetch_selected(context.scene)
 
-    scn.material_browser_material_count = f"Materials: {len(scn.material_browser_items)}"
-    scn.material_browser_material_category_count = f"Materials: {len(scn.material_browser_filtered_items)}"
+def prefetch_selected(scn):
+    # Warm the selected material's library and textures before Append/Link
+    record = get_active_record(scn)
+    if record is None or not getattr(scn, "material_browser_prefetch", True):
+        PREFETCHER.cancel()
+        return
 
-    if len(scn.material_browser_filtered_items) > 0:
-        scn.material_browser_index = 0
+    blend_path = record.blend_file
+    json_path = index_path(material_store.folder, record.library_name)
+    name = record.name
+
+    def resolve(cancel):
+        # With the mirror on, copying the library is the prefetch; it stops
+        # when the selection moves on
+        paths = [MIRROR.fetch(blend_path, cancel=cancel)]
+        if cancel.is_set():
+            return []
+        entries, _, _ = read_index(json_path)
+        for entry in entries:
+            if entry.get("name") == name:
+                paths += [image["path"] for image in (entry.get("cost") or {}).get("images", []) if image.get("path")]
+                break
+        return paths
+
+    PREFETCHER.request((blend_path, name), resolve)
 
 def update_material_browser_filter(self, context):
     filter_material_browser_items(context.scene)
@@ -276,64 +575,89 @@ def update_material_browser_filter(self, context):
 def update_material_browser_category(self, context):
     filter_material_browser_items(context.scene)
 
-def get_category(material_name):
-    material_name_lower = material_name.lower()
-    for category, keywords in KEYWORD_CATEGORIES.items():
-        if any(keyword in material_name_lower for keyword in keywords):
-            return category
-    return "Uncategorized"
-
-def update_change_file_path(self, context):
-    clear_preview_collection()
-    folder_path = bpy.path.abspath(context.scene.material_browser_path)
+def update_material_browser_profiling(self, context):
+    PROFILER.enabled = context.scene.material_browser_profiling
 
-    if not os.path.isdir(folder_path):
-        self.report({'ERROR'}, "Invalid folder path")
-        return {'CANCELLED'}
+def update_material_browser_batched_io(self, context):
+    FS.enabled = context.scene.material_browser_batched_io
+    FS.invalidate()
 
-    all_materials = []
-    context.scene.material_browser_items.clear()
+def mirror_stat(path):
+    return FS.getsize(path), FS.mtime_ns(path)
 
-    blend_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".blend")]
+def configure_mirror(scene):
+    MIRROR.stat = mirror_stat
+    MIRROR.configure(
+        bpy.path.abspath(getattr(scene, "material_browser_mirror_path", "")),
+        int(getattr(scene, "material_browser_mirror_quota_gb", 10.0) * 1024 ** 3),
+        getattr(scene, "material_browser_use_mirror", False),
+    )
 
-    for blend_file in blend_files:
-        blend_path = os.path.join(folder_path, blend_file)
-        cache_folder = os.path.join(folder_path, blend_file.replace(".blend", CACHE_SUFFIX))
-        json_path = os.path.join(cache_folder, JSON_NAME.format(blend_file.replace(".blend", "")))
+def update_material_browser_mirror(self, context):
+    configure_mirror(context.scene)
 
-        if not os.path.exists(json_path):
-            material_data = parse_blend_file(blend_path)
-            write_json(json_path, material_data)
+def remap_mirrored_images(images):
+    # Relative texture paths of an append from the mirror copy resolve next
+    # to the copy; point them back at the library folder
+    for image in images:
+        if image.library or image.packed_file or not image.filepath:
+            continue
+        path = os.path.normpath(bpy.path.abspath(image.filepath))
+        canonical = MIRROR.canonical(path)
+        if canonical != path:
+            image.filepath = canonical
+
+CATEGORY_NAMES = sorted(KEYWORD_CATEGORIES) + ["Uncategorized"]
+# Blender only keeps weak references to dynamic enum strings
+category_enum_items = []
+
+def material_browser_category_items(self, context):
+    facets = search_cache.get("facets")
+    counts = facets.counts(search_cache.get("text_mask")) if facets else {}
+    category_enum_items[:] = [
+        (category, f"{category} ({counts.get(category, 0)})", f"Show {category} materials (Shift to add)", 1 << i)
+        for i, category in enumerate(CATEGORY_NAMES)
+    ]
+    return category_enum_items
+
+def category_label(scn):
+    selected = scn.material_browser_category
+    if not selected:
+        return "All Categories"
+    if len(selected) == 1:
+        return next(iter(selected))
+    return f"{len(selected)} Categories"
+
+# One alternation per category instead of a substring test per keyword
+CATEGORY_PATTERNS = [
+    (category, re.compile("|".join(re.escape(keyword) for keyword in keywords)))
+    for category, keywords in KEYWORD_CATEGORIES.items()
+]
 
-        json_data = read_json(json_path)
-        if json_data:
-            for entry in json_data:
-                entry["blend_file"] = blend_file
-            all_materials.extend(json_data)
+def get_category(material_name):
+    material_name_lower = material_name.lower()
+    for category, pattern in CATEGORY_PATTERNS:
+        if pattern.search(material_name_lower):
+            return category
+    return "Uncategorized"
 
-    refresh_material_list(context, all_materials)
-    load_all_previews(context)
+def update_change_file_path(self, context):
+    with PROFILER.section("update_change_file_path"):
+        clear_preview_collection()
+        folder_path = bpy.path.abspath(context.scene.material_browser_path)
 
-    context.scene.material_browser_material_count = f"Materials: {len(context.scene.material_browser_items)}"
-    context.scene.material_browser_material_category_count = f"Materials: {len(context.scene.material_browser_filtered_items)}"
-    context.scene.material_browser_category = "All"
+        if not FS.isdir(folder_path):
+            self.report({'ERROR'}, "Invalid folder path")
+            return {'CANCELLED'}
 
-    if context.scene.material_browser_filtered_items:
-        context.scene.material_browser_index = 0
+        context.scene.material_browser_category = set()
+        start_refresh(context.scene, folder_path, force=False)
 
 
 # ---------- Custom Property Group ----------
-class MaterialItem(PropertyGroup):
-    name: StringProperty()
-    category: StringProperty()
-    blend_file: StringProperty()
-    preview_path: StringProperty(subtype='FILE_PATH')
-
-class MaterialCache(PropertyGroup):
-    blend_file: StringProperty()
-    folder_path: StringProperty(subtype="DIR_PATH")
-    materials: CollectionProperty(type=MaterialItem)
-    preview_path: StringProperty(subtype='FILE_PATH')
+class MaterialRow(PropertyGroup):
+    # One visible list row; everything else is looked up in material_store
+    store_id: IntProperty(default=-1)
 
 
 # ---------- OPERATORS ----------
@@ -347,46 +671,100 @@ class MATERIALBROWSER_OT_SelectMaterial(bpy.types.Operator):
         context.scene.material_browser_selected_material = self.material_name
         return {'FINISHED'}
 
+class MATERIALBROWSER_OT_FindSimilar(bpy.types.Operator):
+    bl_idname = "materialbrowser.find_similar"
+    bl_label = "Find Similar"
+    bl_description = "List the materials most similar to the selected one in node setup, shading and color"
+
+    def execute(self, context):
+        scn = context.scene
+        record = get_active_record(scn)
+        if record is None:
+            self.report({'WARNING'}, "No material selected")
+            return {'CANCELLED'}
+        if not material_store.has_features(record.id):
+            self.report({'WARNING'}, f"{record.name} has no similarity data yet, refresh the library")
+            return {'CANCELLED'}
+        # Filtering runs from the property update
+        scn.material_browser_similar_to = f"{record.library_name}\t{record.name}"
+        return {'FINISHED'}
+
+
 class MATERIALBROWSER_OT_RefreshCache(bpy.types.Operator):
     bl_idname = "materialbrowser.refresh_cache"
     bl_label = "Refresh Material Cache"
     directory: StringProperty(subtype="DIR_PATH")
 
     def execute(self, context):
-        folder_path = bpy.path.abspath(context.scene.material_browser_path)
+        with PROFILER.section("RefreshCache.execute"):
+            folder_path = bpy.path.abspath(context.scene.material_browser_path)
+
+            if not os.path.isdir(folder_path):
+                self.report({'ERROR'}, f"Invalid folder path: {folder_path}")
+                return {'CANCELLED'}
+
+            # Re-parses, in the background, every library whose .blend changed
+            # since anyone last indexed it; see refresh_job.py
+            start_refresh(context.scene, folder_path, force=True)
 
-        if not os.path.isdir(folder_path):
-            self.report({'ERROR'}, f"Invalid folder path: {folder_path}")
+            self.report({'INFO'}, "Refreshing material cache")
+            return {'FINISHED'}
+
+
+class MATERIALBROWSER_OT_CancelRefresh(bpy.types.Operator):
+    bl_idname = "materialbrowser.cancel_refresh"
+    bl_label = "Cancel Refresh"
+    bl_description = "Stop indexing; materials found so far stay in the list"
+
+    def execute(self, context):
+        cancel_job(context.scene)
+        return {'FINISHED'}
+
+
+class MATERIALBROWSER_OT_ExportProfile(bpy.types.Operator):
+    bl_idname = "materialbrowser.export_profile"
+    bl_label = "Export Profile"
+    bl_description = "Save the recorded timings as JSON statistics or a Chrome trace"
+
+    filepath: StringProperty(subtype='FILE_PATH')
+    format: EnumProperty(
+        name="Format",
+        items=[
+            ("JSON", "JSON", "Per-section call counts, totals and percentiles"),
+            ("CHROME", "Chrome Trace", "Timeline for chrome://tracing or Perfetto"),
+        ],
+        default="JSON"
+    )
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            name = "material_browser_trace.json" if self.format == "CHROME" else "material_browser_profile.json"
+            self.filepath = os.path.join(os.path.expanduser("~"), name)
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        filepath = bpy.path.abspath(self.filepath)
+        try:
+            PROFILER.export(filepath, self.format)
+        except OSError as e:
+            self.report({'ERROR'}, f"Failed to export profile: {e}")
             return {'CANCELLED'}
 
-        context.scene.material_cache.folder_path = folder_path
-        context.scene.material_cache.materials.clear()
-
-        blend_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".blend")]
-
-        for blend_file in blend_files:
-            blend_path = os.path.join(folder_path, blend_file)
-            cache_folder = os.path.join(folder_path, blend_file.replace(".blend", CACHE_SUFFIX))
-            preview_folder = os.path.join(cache_folder, PREVIEW_FOLDER)
-            context.scene.previews_folder_path = preview_folder
-
-            json_path = os.path.join(cache_folder, JSON_NAME.format(blend_file.replace(".blend", "")))
-            mats = parse_blend_file(blend_path)
-            os.makedirs(cache_folder, exist_ok=True)
-            write_json(json_path, mats)
-            refresh_material_list(context, mats, blend_file)
-            load_all_previews(context)
-        
-        if context.scene.material_browser_filtered_items:
-            first_item = context.scene.material_browser_filtered_items[0]
-            context.scene.material_browser_selected_material = first_item.name
-            context.scene.material_browser_index = 0
-
-        self.report({'INFO'}, "Material cache fully refreshed")
-        print("Material cache fully refreshed.")
+        self.report({'INFO'}, f"Profile exported to {filepath}")
+        return {'FINISHED'}
+
+
+class MATERIALBROWSER_OT_ResetProfile(bpy.types.Operator):
+    bl_idname = "materialbrowser.reset_profile"
+    bl_label = "Reset Profile"
+    bl_description = "Clear all recorded timings"
+
+    def execute(self, context):
+        PROFILER.reset()
         return {'FINISHED'}
-    
-    
+
+
 class MATERIALBROWSER_OT_AppendMaterial(bpy.types.Operator):
     bl_idname = "materialbrowser.append_material"
     bl_label = "Append Material"
@@ -409,12 +787,14 @@ class MATERIALBROWSER_OT_AppendMaterial(bpy.types.Operator):
                 self.report({'ERROR'}, f"Blend file not found: {blend_path}")
                 return {'CANCELLED'}
 
-            with bpy.data.libraries.load(blend_path, link=False) as (data_from, data_to):
+            images_before = set(bpy.data.images)
+            with bpy.data.libraries.load(MIRROR.fetch(blend_path), link=False) as (data_from, data_to):
                 if material_name in data_from.materials:
                     data_to.materials = [material_name]
                 else:
                     self.report({'ERROR'}, f"Material {material_name} not found in {blend_path}")
                     return {'CANCELLED'}
+            remap_mirrored_images(set(bpy.data.images) - images_before)
 
             # Check again after loading
             mat = bpy.data.materials.get(material_name)
@@ -465,6 +845,8 @@ class MATERIALBROWSER_OT_LinkMaterial(bpy.types.Operator):
 
         mat = bpy.data.materials.get(material_name)
         if not mat:
+            # Always the canonical path, never the mirror copy: the link is
+            # saved in the user's file
             with bpy.data.libraries.load(blend_path, link=True) as (data_from, data_to):
                 if material_name in data_from.materials:
                     data_to.materials = [material_name]
@@ -486,12 +868,13 @@ class MATERIALBROWSER_OT_LinkMaterial(bpy.types.Operator):
 
 # ---------- UI Lists -----------
 class MATERIALBROWSER_UL_items(bpy.types.UIList):
-    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
-        pcoll = preview_collections.get("material_thumbs")
-        icon_id = 0
+    def draw_item(self, context, layout, data, row_item, icon, active_data, active_propname, index):
+        item = material_store.record(row_item.store_id)
+        if item is None:
+            return
 
-        if pcoll and item.name in pcoll:
-            icon_id = pcoll[item.name].icon_id
+        pcoll = preview_collections.get("material_thumbs")
+        icon_id = get_preview_icon_id(pcoll, item)
 
         in_scene = item.name in bpy.data.materials
         status_icon = 'CHECKMARK' if in_scene else 'IMPORT'
@@ -507,6 +890,8 @@ class MATERIALBROWSER_UL_items(bpy.types.UIList):
                 row.label(text="", icon='QUESTION')
 
             row.label(text=item.name)
+            if item.has_cost and item.texture_count:
+                row.label(text=format_bytes(int(item.memory_mb * 1024 ** 2)))
             row.label(text="", icon=status_icon)
             
 
@@ -518,67 +903,146 @@ class MATERIALBROWSER_PT_Panel(Panel):
     bl_category = "TMG"
 
     def draw(self, context):
-        layout = self.layout
-        scn = context.scene
+        with PROFILER.section("MATERIALBROWSER_PT_Panel.draw"):
+            layout = self.layout
+            scn = context.scene
 
-        box = layout.box()
-        col = box.column()
-        row = col.row()
-        row.prop(scn, "material_browser_path", text="")
-        row.operator("materialbrowser.refresh_cache", text="", icon="FILE_REFRESH")
-        col = box.column()
-        col.label(text=scn.material_browser_material_count)
+            box = layout.box()
+            col = box.column()
+            row = col.row()
+            row.prop(scn, "material_browser_path", text="")
+            row.prop(scn, "material_browser_batched_io", text="", icon='NETWORK_DRIVE')
+            row.operator("materialbrowser.refresh_cache", text="", icon="FILE_REFRESH")
+            row = box.row(align=True)
+            row.prop(scn, "material_browser_prefetch")
+            row.prop(scn, "material_browser_use_mirror")
+            if scn.material_browser_use_mirror:
+                row.prop(scn, "material_browser_mirror_quota_gb", text="GB")
+                box.prop(scn, "material_browser_mirror_path", text="Mirror")
+            col = box.column()
+            col.label(text=scn.material_browser_material_count)
 
-        box = layout.box()
-        col = box.column()
-        col.prop(scn, "enable_displacement")
+            job = get_job(scn)
+            if job and not job.finished:
+                row = box.row(align=True)
+                row.progress(factor=job.progress, type='BAR', text=job.progress_text())
+                row.operator("materialbrowser.cancel_refresh", text="", icon='CANCEL')
 
-        # box = layout.box()
-        # col = box.column()
-        # col.prop(scn, "material_browser_category", text="Category")
-        # col.label(text=scn.material_browser_material_category_count)
+            row = box.row(align=True)
+            row.prop(scn, "material_browser_filter", text="", icon='VIEWZOOM')
+            row.prop(scn, "material_browser_search_mode", text="")
+            if scn.material_browser_search_mode == 'FUZZY':
+                row.prop(scn, "material_browser_max_results", text="Top")
 
-        items = getattr(scn, "material_browser_filtered_items", None)
-        index = getattr(scn, "material_browser_index", -1)
-        active_item = items[index] if items and 0 <= index < len(items) else None
+            row = box.row(align=True)
+            row.prop(scn, "material_browser_sort", text="Sort")
+            row.prop(scn, "material_browser_max_memory", text="Max MB")
 
-        if active_item:
             box = layout.box()
             col = box.column()
+            col.prop(scn, "enable_displacement")
 
-            pcoll = preview_collections.get("material_thumbs")
-
-            row = col.row(align=True)
-            if pcoll and active_item.name in pcoll:
-                icon_id = pcoll[active_item.name].icon_id
-                row.template_icon(icon_value=icon_id, scale=10.0)
+            box = layout.box()
+            row = box.row(align=True)
+            row.prop_menu_enum(scn, "material_browser_category", text=category_label(scn), icon='FILTER')
+            if scn.material_browser_category:
+                op = row.operator("wm.context_set_value", text="", icon='X')
+                op.data_path = "scene.material_browser_category"
+                op.value = "set()"
+            similar_to = scn.material_browser_similar_to
+            if similar_to:
+                row = box.row(align=True)
+                row.label(text=f"Similar to {similar_to.split(chr(9))[-1]}", icon='SORTBYEXT')
+                op = row.operator("wm.context_set_value", text="", icon='X')
+                op.data_path = "scene.material_browser_similar_to"
+                op.value = "''"
+            box.label(text=scn.material_browser_material_category_count)
+
+            active_item = get_active_record(scn)
+
+            if active_item:
+                box = layout.box()
+                col = box.column()
+
+                pcoll = preview_collections.get("material_thumbs")
+
+                row = col.row(align=True)
+                icon_id = get_preview_icon_id(pcoll, active_item)
+                if icon_id:
+                    row.template_icon(icon_value=icon_id, scale=10.0)
+                else:
+                    row.label(text="", icon='QUESTION')
+                    row.scale_y = 10.0
+                    row.alignment = 'CENTER'
+
+                if active_item.has_cost:
+                    info = col.column(align=True)
+                    info.label(text=f"Nodes: {active_item.node_count}   Textures: {active_item.texture_count}")
+                    info.label(
+                        text=f"Disk: {format_bytes(int(active_item.texture_mb * 1024 ** 2))}   "
+                             f"RAM: {format_bytes(int(active_item.memory_mb * 1024 ** 2))}   "
+                             f"VRAM: {format_bytes(int(active_item.vram_mb * 1024 ** 2))}",
+                        icon='MEMORY'
+                    )
+                col.operator("materialbrowser.find_similar", icon='SORTBYEXT')
+
+                col = layout.column()
+                row = col.row(align=True)
+
+            if active_item and context.selected_objects:
+                if hasattr(active_item, "blend_file") and hasattr(active_item, "name"):
+                    blend_path = bpy.path.abspath(active_item.blend_file)
+
+                    append_op = row.operator("materialbrowser.append_material", text="Append", icon='IMPORT')
+                    append_op.blend_file = blend_path
+                    append_op.material_name = active_item.name
+
+                    link_op = row.operator("materialbrowser.link_material", text="Link", icon='LINKED')
+                    link_op.blend_file = blend_path
+                    link_op.material_name = active_item.name
+                else:
+                    col.label(text="Invalid material entry", icon='ERROR')
             else:
-                row.label(text="", icon='QUESTION')
-                row.scale_y = 10.0
-                row.alignment = 'CENTER'
+                col.label(text="No materials selected to append / link")
 
-            col = layout.column()
-            row = col.row(align=True)
+            col.row().template_list(
+                "MATERIALBROWSER_UL_items", "materials",
+                context.window_manager, "material_browser_rows",
+                scn, "material_browser_index",
+                rows=12
+            )
 
-        if active_item and context.selected_objects:
-            if hasattr(active_item, "blend_file") and hasattr(active_item, "name"):
-                blend_path = bpy.path.abspath(active_item.blend_file)
+            self.draw_debug(layout, scn)
 
-                append_op = row.operator("materialbrowser.append_material", text="Append", icon='IMPORT')
-                append_op.blend_file = blend_path
-                append_op.material_name = active_item.name
+    def draw_debug(self, layout, scn):
+        box = layout.box()
+        row = box.row()
+        row.prop(
+            scn, "material_browser_show_debug", text="Debug",
+            icon='TRIA_DOWN' if scn.material_browser_show_debug else 'TRIA_RIGHT',
+            emboss=False
+        )
+        if not scn.material_browser_show_debug:
+            return
 
-                link_op = row.operator("materialbrowser.link_material", text="Link", icon='LINKED')
-                link_op.blend_file = blend_path
-                link_op.material_name = active_item.name
-            else:
-                col.label(text="Invalid material entry", icon='ERROR')
-        else:
-            col.label(text="No materials selected to append / link")
+        box.prop(scn, "material_browser_profiling", text="Record Timings")
 
-        col.row().template_list(
-            "MATERIALBROWSER_UL_items", "materials",
-            scn, "material_browser_filtered_items",
-            scn, "material_browser_index",
-            rows=12
-        )
+        stats = PROFILER.stats()
+        if not stats:
+            box.label(text="No timings recorded")
+        else:
+            col = box.column(align=True)
+            for name, section in sorted(stats.items(), key=lambda kv: kv[1]["total_ms"], reverse=True):
+                col.label(text=name)
+                col.label(
+                    text=f"    {section['calls']}x  total {section['total_ms']:.1f} ms  "
+                         f"p50 {section['p50_ms']:.2f}  p90 {section['p90_ms']:.2f}  "
+                         f"p99 {section['p99_ms']:.2f}  items {section['items']}"
+                )
+
+        row = box.row(align=True)
+        op = row.operator("materialbrowser.export_profile", text="JSON", icon='EXPORT')
+        op.format = "JSON"
+        op = row.operator("materialbrowser.export_profile", text="Trace", icon='EXPORT')
+        op.format = "CHROME"
+        row.operator("materialbrowser.reset_profile", text="", icon='TRASH')
@@ -0,0 +1,164 @@
+# Columnar in-memory index of the materials in the browsed folder.
+#
+# One row per material, spread over parallel arrays: names are interned
+# strings, categories and libraries are small ints into lookup tables, and
+# the folder path is stored once. None of it lives in RNA, so the index
+# isn't written into the user's .blend files and loading it never goes
+# through bpy. Only the rows currently shown in the list are RNA items, and
+# those just hold an id into this store. Kept free of bpy.
+
+import os
+import sys
+from array import array
+
+
+class MaterialRecord:
+    """Read-only view of one store row, with the fields the UI reads."""
+
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, item_id):
+        self.store = store
+        self.id = item_id
+
+    @property
+    def name(self):
+        return self.store.names[self.id]
+
+    @property
+    def category(self):
+        return self.store.categories[self.store.category[self.id]]
+
+    @property
+    def library_name(self):
+        return self.store.libraries[self.store.library[self.id]]
+
+    @property
+    def blend_file(self):
+        return os.path.join(self.store.folder, self.library_name)
+
+    @property
+    def has_cost(self):
+        return bool(self.store.has_cost[self.id])
+
+    @property
+    def node_count(self):
+        return self.store.node_count[self.id]
+
+    @property
+    def texture_count(self):
+        return self.store.texture_count[self.id]
+
+    @property
+    def texture_mb(self):
+        return self.store.texture_bytes[self.id] / 1024 ** 2
+
+    @property
+    def memory_mb(self):
+        return self.store.ram_bytes[self.id] / 1024 ** 2
+
+    @property
+    def vram_mb(self):
+        return self.store.vram_bytes[self.id] / 1024 ** 2
+
+
+class MaterialStore:
+    def __init__(self, feature_dim=0):
+        # Floats per row in `features`, one flat row-major float32 column
+        self.feature_dim = feature_dim
+        self.clear()
+
+    def clear(self, folder=""):
+        self.folder = folder
+        # Lookup tables the per-row small ints point into
+        self.libraries = []
+        self.library_ids = {}
+        self.categories = []
+        self.category_ids = {}
+
+        self.names = []
+        self.library = array("I")
+        self.category = array("H")
+        self.has_cost = array("B")
+        self.node_count = array("I")
+        self.texture_count = array("I")
+        self.texture_bytes = array("Q")
+        self.ram_bytes = array("Q")
+        self.vram_bytes = array("Q")
+        self.features = array("f")
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _lookup(table, ids, value):
+        code = ids.get(value)
+        if code is None:
+            code = ids[value] = len(table)
+            table.append(value)
+        return code
+
+    def add(self, entries, categorize):
+        """Append index entries ({"name", "blend_file", "cost"?} dicts).
+
+        `categorize(name)` assigns the category, so renamed keyword
+        categories apply without reindexing.
+        """
+        no_features = [0.0] * self.feature_dim
+        for entry in entries:
+            name = sys.intern(entry.get("name", "Unnamed"))
+            self.names.append(name)
+            self.library.append(self._lookup(self.libraries, self.library_ids, entry["blend_file"]))
+            self.category.append(self._lookup(self.categories, self.category_ids, categorize(name)))
+
+            cost = entry.get("cost")
+            if cost:
+                self.has_cost.append(1)
+                self.node_count.append(cost.get("node_count", 0))
+                self.texture_count.append(len(cost.get("images", [])))
+                self.texture_bytes.append(cost.get("texture_bytes", 0))
+                self.ram_bytes.append(cost.get("ram_bytes", 0))
+                self.vram_bytes.append(cost.get("vram_bytes", 0))
+                features = cost.get("features")
+                # Indexes written before features existed, or with another layout
+                self.features.extend(features if features and len(features) == self.feature_dim else no_features)
+            else:
+                self.has_cost.append(0)
+                self.node_count.append(0)
+                self.texture_count.append(0)
+                self.texture_bytes.append(0)
+                self.ram_bytes.append(0)
+                self.vram_bytes.append(0)
+                self.features.extend(no_features)
+
+    def record(self, item_id):
+        if 0 <= item_id < len(self.names):
+            return MaterialRecord(self, item_id)
+        return None
+
+    def has_features(self, item_id):
+        """Whether the row has a feature vector (zero-filled when it has none)."""
+        dim = self.feature_dim
+        return dim > 0 and any(self.features[item_id * dim:(item_id + 1) * dim])
+
+    def category_names(self):
+        """Category of every row, by id."""
+        categories = self.categories
+        return [categories[code] for code in self.category]
+
+    def names_by_library(self):
+        result = {}
+        libraries = self.libraries
+        for name, code in zip(self.names, self.library):
+            result.setdefault(libraries[code], []).append(name)
+        return result
+
+    def nbytes(self):
+        """Rough memory footprint: the arrays plus one copy of each string."""
+        columns = (self.library, self.category, self.has_cost, self.node_count, self.texture_count,
+                   self.texture_bytes, self.ram_bytes, self.vram_bytes, self.features)
+        size = sum(column.itemsize * len(column) for column in columns)
+        size += sys.getsizeof(self.names)
+        size += sum(sys.getsizeof(name) for name in set(self.names))
+        size += sum(sys.getsizeof(value) for value in self.libraries + self.categories)
+        return size
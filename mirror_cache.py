@@ -0,0 +1,233 @@
+# Local read-through mirror of library files that live on a network share.
+#
+# fetch() returns a local copy of a remote file, copying it on first use.
+# Copies are validated against the remote size and mtime (the local file's
+# mtime is set to the remote one), written to a temp file and renamed into
+# place, and evicted least recently used first once the mirror grows past
+# its quota. Append-only files that grew get just their new tail copied. The access time is set explicitly on every use, so LRU works
+# on noatime mounts too. Each remote folder maps to one local folder, and
+# canonical() maps a path inside it back, for texture paths that Blender
+# resolved relative to the local copy. Kept free of bpy so the render
+# workers can use it too.
+
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+
+DEFAULT_QUOTA = 10 * 1024 ** 3
+# Local filesystems may store mtimes a little coarser than the remote
+MTIME_TOLERANCE_NS = 1_000_000
+COPY_BLOCK = 1024 * 1024
+# Bytes compared before a grown append-only file is extended in place
+APPEND_CHECK = 4096
+
+
+def default_root():
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "tmg_material_browser", "mirror")
+
+
+def remote_stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def copy_blocks(src, dst, cancel=None):
+    """Copy `src` to `dst`, stopping between blocks once `cancel` is set.
+    Returns whether the whole file was copied."""
+    while cancel is None or not cancel.is_set():
+        block = src.read(COPY_BLOCK)
+        if not block:
+            return True
+        dst.write(block)
+    return False
+
+
+class MirrorCache:
+    def __init__(self, root="", quota_bytes=DEFAULT_QUOTA, enabled=False, stat=remote_stat):
+        self.stat = stat
+        self.dirs = {}
+        self.used = None
+        self._lock = threading.Lock()
+        # Prefetch threads add folders while the UI thread maps paths back
+        self._dirs_lock = threading.Lock()
+        self.configure(root, quota_bytes, enabled)
+
+    def configure(self, root, quota_bytes, enabled):
+        self.root = os.path.abspath(root or default_root())
+        self.quota = quota_bytes
+        self.enabled = enabled
+        # local folder -> remote folder, for canonical()
+        with self._dirs_lock:
+            self.dirs = {}
+        self.used = None
+
+    def local_dir(self, remote_dir):
+        remote_dir = os.path.normpath(os.path.abspath(remote_dir))
+        key = hashlib.blake2b(os.path.normcase(remote_dir).encode("utf-8"), digest_size=8).hexdigest()
+        local = os.path.join(self.root, f"{os.path.basename(remote_dir) or 'root'}_{key}")
+        with self._dirs_lock:
+            self.dirs[os.path.normcase(local)] = remote_dir
+        return local
+
+    def local_path(self, remote_path):
+        remote_path = os.path.abspath(remote_path)
+        local_dir = self.local_dir(os.path.dirname(remote_path))
+        return os.path.join(local_dir, os.path.basename(remote_path))
+
+    def canonical(self, path):
+        """Map a path inside a mirrored folder back to the remote folder."""
+        with self._dirs_lock:
+            dirs = list(self.dirs.items())
+        if not dirs:
+            return path
+        norm = os.path.normcase(os.path.normpath(path))
+        for local_dir, remote_dir in dirs:
+            if norm == local_dir or norm.startswith(local_dir + os.sep):
+                return os.path.join(remote_dir, os.path.normpath(path)[len(local_dir) + 1:])
+        return path
+
+    # ---------- Reading ----------
+    def fetch(self, remote_path, immutable=False, append_only=False, cancel=None):
+        """Path to read `remote_path` from: the local copy, or the remote
+        file itself when mirroring is off or the copy can't be made.
+
+        `immutable` files (content-addressed thumbnails) are never
+        revalidated once copied. `append_only` files (thumbnail packs) that
+        grew only have the new tail copied. A copy made on a background
+        thread stops between blocks once the `cancel` event is set, and the
+        remote path is returned instead.
+        """
+        if not self.enabled:
+            return remote_path
+
+        local_path = self.local_path(remote_path)
+        try:
+            if immutable and os.path.exists(local_path):
+                self._touch(local_path)
+                return local_path
+
+            size, mtime_ns = self.stat(remote_path)
+            try:
+                st = os.stat(local_path)
+                local_size = st.st_size
+                valid = local_size == size and abs(st.st_mtime_ns - mtime_ns) <= MTIME_TOLERANCE_NS
+            except OSError:
+                local_size = None
+                valid = False
+
+            if valid:
+                self._touch(local_path)
+            elif not (append_only and local_size is not None and local_size < size
+                      and self._extend(remote_path, local_path, local_size, size, mtime_ns)):
+                if not self._copy(remote_path, local_path, size, mtime_ns, cancel):
+                    return remote_path
+            return local_path
+        except OSError as e:
+            print(f"[MaterialBrowser] Mirror failed for {remote_path}, reading it directly: {e}")
+            return remote_path
+
+    def _touch(self, local_path):
+        # Explicit access time for LRU; keeps the mirrored mtime
+        st = os.stat(local_path)
+        os.utime(local_path, ns=(time.time_ns(), st.st_mtime_ns))
+
+    def _copy(self, remote_path, local_path, size, mtime_ns, cancel=None):
+        """Copy into place; False if `cancel` was set before it finished."""
+        directory = os.path.dirname(local_path)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            # A stale copy is replaced, so its space is reused
+            replaced = os.path.getsize(local_path)
+        except OSError:
+            replaced = 0
+        self.make_room(size - replaced, keep=local_path)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as dst, open(remote_path, "rb") as src:
+                finished = copy_blocks(src, dst, cancel)
+            if not finished:
+                os.remove(tmp_path)
+                return False
+            os.utime(tmp_path, ns=(time.time_ns(), mtime_ns))
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self.used is not None:
+                self.used += size - replaced
+        return True
+
+    def _extend(self, remote_path, local_path, local_size, size, mtime_ns):
+        # Only valid while the copy is a prefix of the remote file: its last
+        # bytes must still be there, or the remote was rewritten meanwhile
+        check = min(local_size, APPEND_CHECK)
+        with open(remote_path, "rb") as src, open(local_path, "r+b") as dst:
+            src.seek(local_size - check)
+            dst.seek(local_size - check)
+            if src.read(check) != dst.read(check):
+                return False
+            self.make_room(size - local_size, keep=local_path)
+            dst.seek(local_size)
+            shutil.copyfileobj(src, dst, COPY_BLOCK)
+            added = dst.tell() - local_size
+        os.utime(local_path, ns=(time.time_ns(), mtime_ns))
+
+        with self._lock:
+            if self.used is not None:
+                self.used += added
+        return True
+
+    # ---------- Quota ----------
+    def _scan(self):
+        files = []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name.startswith(".tmp_"):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_atime_ns, st.st_size, path))
+        return files
+
+    def make_room(self, incoming, keep=None):
+        """Evict least recently used copies until `incoming` bytes fit."""
+        with self._lock:
+            if self.used is None:
+                self.used = sum(size for _, size, _ in self._scan())
+            if self.used + incoming <= self.quota:
+                return 0
+
+            removed = 0
+            for _, size, path in sorted(self._scan()):
+                if self.used + incoming <= self.quota:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    # In use by another process (Windows); try the next one
+                    continue
+                self.used -= size
+                removed += 1
+            return removed
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.used = None
+
+
+MIRROR = MirrorCache()
@@ -3,18 +3,36 @@ import os
 import subprocess
 import threading
 import queue
-import multiprocessing
+import math
+import time
+import tempfile
 
 from bpy.app.handlers import persistent
 from bpy.types import Panel, Operator, PropertyGroup, UIList
 from bpy.props import StringProperty, BoolProperty, PointerProperty, CollectionProperty, IntProperty,EnumProperty
 
+from .profiling import PROFILER, profiled
+from .material_list import reload_changed_previews
+from .render_protocol import parse_marker, write_skip_file, RECYCLE_EXIT_CODE
+from .render_scheduler import (
+    plan_workers, calibration_splits, resolve_worker_count, save_calibration, format_cpus
+)
+from .render_journal import RenderJournal, journal_path, QUARANTINED
+from .mirror_cache import MIRROR
+
 
 addon_dir = os.path.dirname(__file__)
 # render_script_path = os.path.join(addon_dir, "preview_renderer.py")
 render_scene_path = os.path.join(addon_dir, "render_previews.blend")
 
 log_queue = queue.Queue()
+log_lock = threading.Lock()
+
+CHUNKS_PER_WORKER = 2
+# Image Type -> the format argument of the workers
+IMAGE_EXTS = {"PNG": "png", "JPEG": "jpg", "PACKED": "pack"}
+# Timed renders per worker when calibrating
+CALIBRATION_RENDERS = 5
 
 def redraw_ui():
     try:
@@ -44,6 +62,17 @@ def log_timer():
                 area.tag_redraw()
     return 0.5
 
+def watch_previews_timer():
+    # Swap in draft and refined thumbnails as the workers write them
+    context = bpy.context
+    props = context.scene.material_preview_props
+    browser_path = getattr(context.scene, "material_browser_path", "")
+    if browser_path and os.path.normpath(bpy.path.abspath(browser_path)) == \
+            os.path.normpath(bpy.path.abspath(props.blend_folder)):
+        if reload_changed_previews(context):
+            redraw_ui()
+    return 2.0 if props.is_rendering else None
+
 def safe_save_blend_file():
     if bpy.data.filepath:
         bpy.ops.wm.save_mainfile()
@@ -53,13 +82,104 @@ def safe_save_blend_file():
         return False
 
 def append_log_line(text):
-    props = bpy.context.scene.material_preview_props
-    log_items = bpy.context.scene.material_preview_props.log_items
-    item = log_items.add()
-    item.text = text
-    props.active_index = len(log_items) - 1
+    # Called from every worker's launcher thread
+    with log_lock:
+        props = bpy.context.scene.material_preview_props
+        log_items = bpy.context.scene.material_preview_props.log_items
+        item = log_items.add()
+        item.text = text
+        props.active_index = len(log_items) - 1
     redraw_ui()
 
+def calibration_path():
+    # Per user and machine, not per .blend
+    return os.path.join(bpy.utils.user_resource('CONFIG', path="tmg_material_browser"), "render_calibration.json")
+
+def slot_options(slot, pin):
+    options = ["--threads", str(slot["threads"])]
+    if pin:
+        options += ["--cpus", format_cpus(slot["cpus"])]
+    return options
+
+def run_worker(args, journal, tier, timeout, label):
+    """Run one worker process, recording its progress in the journal.
+
+    A worker that spends more than `timeout` seconds on one material is
+    killed and that material counts as failed. Returns (exit code, whether
+    the worker got through any material).
+    """
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    # Read in a thread so a silent, hung worker can't block the timeout
+    lines = queue.Queue()
+
+    def pump():
+        for line in proc.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    threading.Thread(target=pump, daemon=True).start()
+
+    current = None
+    started_at = 0.0
+    progressed = False
+
+    while True:
+        try:
+            line = lines.get(timeout=0.5)
+        except queue.Empty:
+            if current and timeout and time.monotonic() - started_at > timeout:
+                append_log_line(f"{label}: {current[1]} timed out after {timeout}s, restarting worker\n")
+                proc.kill()
+                journal.fail(tier, current[0], current[1], f"Timed out after {timeout}s")
+                current = None
+                # The hung material is journaled and retried on its own, like
+                # a crash, so the materials queued behind it still get a go
+                progressed = True
+            continue
+        if line is None:
+            break
+
+        marker = parse_marker(line)
+        if marker is None:
+            append_log_line(line)
+            continue
+
+        kind, fields = marker
+        if kind == "QUEUE":
+            journal.queue(tier, fields[0], fields[1:])
+        elif kind == "START":
+            current = (fields[0], fields[1])
+            started_at = time.monotonic()
+            journal.start(tier, *current)
+        elif kind == "DONE":
+            journal.done(tier, fields[0], fields[1])
+            # Workers save a thumbnail while rendering the next material, so
+            # this may finish an earlier one
+            if current == (fields[0], fields[1]):
+                current = None
+            progressed = True
+        elif kind == "FAIL":
+            state = journal.fail(tier, fields[0], fields[1], fields[2])
+            what = fields[1] or fields[0]
+            if state == QUARANTINED:
+                append_log_line(f"{label}: quarantined {what} ({fields[2]})\n")
+            if current == (fields[0], fields[1]) or not fields[1]:
+                current = None
+            # A file that can't be rendered at all is no progress: a worker
+            # failing it on every start must run out of attempts
+            if fields[1]:
+                progressed = True
+        elif kind == "RECYCLE":
+            append_log_line(f"{label} recycling at {fields[0]} MB\n")
+
+    code = proc.wait()
+    if current is not None:
+        # Crashed in the middle of a material
+        journal.fail(tier, current[0], current[1], f"Worker exited with code {code}")
+        progressed = True
+    return code, progressed
+
 def clear_log():
     props = bpy.context.scene.material_preview_props
     props.log_items.clear()
@@ -82,52 +202,59 @@ class MATERIALPREVIEW_OT_start_render(Operator):
     bl_label = "Start Material Previews Render"
 
     def execute(self, context):
-        clear_log()
-        # show_popup("Starting render process")
-        append_log_line("Starting render process")
-        props = context.scene.material_preview_props
+        with PROFILER.section("start_render.execute"):
+            clear_log()
+            # show_popup("Starting render process")
+            append_log_line("Starting render process")
+            props = context.scene.material_preview_props
 
-        if props.is_rendering:
-            self.report({'WARNING'}, "Render already in progress!")
-            return {'CANCELLED'}
+            if props.is_rendering:
+                self.report({'WARNING'}, "Render already in progress!")
+                return {'CANCELLED'}
 
-        blend_folder = bpy.path.abspath(props.blend_folder)
-        render_scene_path = bpy.path.abspath(props.render_scene)
+            blend_folder = bpy.path.abspath(props.blend_folder)
+            render_scene_path = bpy.path.abspath(props.render_scene)
 
-        if not os.path.isdir(blend_folder):
-            self.report({'ERROR'}, "Invalid blend folder path")
-            return {'CANCELLED'}
+            if not os.path.isdir(blend_folder):
+                self.report({'ERROR'}, "Invalid blend folder path")
+                return {'CANCELLED'}
 
-        if not os.path.isfile(render_scene_path):
-            self.report({'ERROR'}, "Invalid render scene file")
-            return {'CANCELLED'}
+            if not os.path.isfile(render_scene_path):
+                self.report({'ERROR'}, "Invalid render scene file")
+                return {'CANCELLED'}
 
-        # if not safe_save_blend_file():
-        #     self.report({'ERROR'}, "Please save the current file before starting the render process.")
-        #     return {'CANCELLED'}
+            # if not safe_save_blend_file():
+            #     self.report({'ERROR'}, "Please save the current file before starting the render process.")
+            #     return {'CANCELLED'}
 
-        props.is_rendering = True
+            props.is_rendering = True
 
-        threading.Thread(
-            target=self.launch_render_processes,
-            args=(blend_folder, render_scene_path),
-            daemon=True
-        ).start()
+            threading.Thread(
+                target=self.launch_render_processes,
+                args=(blend_folder, render_scene_path),
+                daemon=True
+            ).start()
 
-        bpy.app.timers.register(log_timer)
+            bpy.app.timers.register(log_timer)
+            bpy.app.timers.register(watch_previews_timer, first_interval=2.0)
 
-        return {'FINISHED'}
+            return {'FINISHED'}
 
+    @profiled("launch_render_processes")
     def launch_render_processes(self, blend_folder, render_scene_path):
         props = bpy.context.scene.material_preview_props
 
         overwrite_all_previews = props.overwrite_all_previews
-        image_format = props.image_type.lower()  # 'png' or 'jpeg'
-        img_ext = "jpg" if image_format == "jpeg" else "png"
+        img_ext = IMAGE_EXTS[props.image_type]
 
         blend_files = [f for f in os.listdir(blend_folder) if f.endswith(".blend")]
-        num_cores = multiprocessing.cpu_count()
-        chunk_size = max(1, len(blend_files) // num_cores)
+
+        # Workers run side by side, each rendering with the threads of its
+        # own share of the cores instead of all of them
+        workers = resolve_worker_count(props.render_workers, calibration_path())
+        slots = plan_workers(min(workers, max(1, len(blend_files))))
+        # A few chunks per worker so one slow file doesn't hold up the rest
+        chunk_size = max(1, math.ceil(len(blend_files) / (len(slots) * CHUNKS_PER_WORKER)))
 
         def chunk_list(lst, n):
             for i in range(0, len(lst), n):
@@ -138,29 +265,100 @@ class MATERIALPREVIEW_OT_start_render(Operator):
         addon_dir = os.path.dirname(__file__)
         render_script_path = os.path.join(addon_dir, "preview_renderer.py")
 
-        for i, chunk in enumerate(chunks):
-            args = [
-                blender_executable,
-                "--background",
-                render_scene_path,
-                "--python",
-                render_script_path,
-                "--",
-                img_ext,
-                str(overwrite_all_previews).lower(),
-                blend_folder,
-            ] + chunk
-
-            append_log_line(f"Launching process {i+1} with {len(chunk)} blend files\n")
-
-            proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-
-            for line in proc.stdout:
-                append_log_line(line)
-
-            proc.wait()
+        # Progressive: a cheap draft pass over the whole library first, then
+        # the refine pass replaces drafts at full quality.
+        tiers = ["draft", "final"] if props.progressive_render else ["final"]
+
+        worker_options = [
+            "--max-rss-mb", str(props.worker_memory_limit_mb),
+            "--image-cache-mb", str(props.image_cache_mb),
+        ]
+        if MIRROR.enabled:
+            # Workers share the browser's mirror, so a library copied once
+            # serves the index, Append and every worker
+            worker_options += ["--mirror-dir", MIRROR.root, "--mirror-quota-mb", str(MIRROR.quota // (1024 * 1024))]
+
+        # Every job is journaled, so a crash, a hang or closing Blender
+        # loses nothing: the next run picks up where this one stopped.
+        journal = RenderJournal(journal_path(blend_folder), max_attempts=props.max_attempts)
+        settings = {"img_ext": img_ext, "overwrite": overwrite_all_previews, "tiers": tiers}
+        if journal.begin_run(settings, resume=props.resume_render):
+            counts = journal.counts()
+            append_log_line(f"Resuming previous run ({counts['done']} materials already done)\n")
+        append_log_line(f"Running {len(slots)} workers with {slots[0]['threads']} threads each\n")
+
+        def render_chunk(tier, i, chunk, slot):
+            label = f"Process {i+1}"
+            # Workers that outgrow their memory limit, crash or hang
+            # are restarted on what is left; failed materials come back
+            # once their retry delay has passed.
+            stalls = 0
+            while stalls < props.max_attempts:
+                now = time.time()
+                pending = [b for b in chunk if journal.needs_work(tier, b, now)]
+                if not pending:
+                    retry_at = journal.next_retry(tier, chunk)
+                    if retry_at is None:
+                        break
+                    time.sleep(min(1.0, max(0.0, retry_at - time.time())))
+                    continue
+
+                args = [
+                    blender_executable,
+                    "--background",
+                    render_scene_path,
+                    "--python",
+                    render_script_path,
+                    "--",
+                    img_ext,
+                    str(overwrite_all_previews).lower(),
+                    blend_folder,
+                ] + pending + ["--tier", tier] + worker_options + slot_options(slot, props.pin_workers)
+                skip_file = write_skip_file(journal.skip_map(tier, pending, now))
+                args += ["--skip-file", skip_file]
+
+                append_log_line(f"Launching process {i+1} with {len(pending)} blend files\n")
+                try:
+                    code, progressed = run_worker(args, journal, tier, props.material_timeout, label)
+                finally:
+                    os.remove(skip_file)
+
+                # A worker dying before it touches any material would
+                # otherwise be relaunched forever
+                stalls = 0 if progressed else stalls + 1
+                if code not in (0, RECYCLE_EXIT_CODE):
+                    append_log_line(f"{label} exited with code {code}\n")
+
+            if stalls >= props.max_attempts:
+                append_log_line(f"{label} gave up after {stalls} failed starts\n")
             append_log_line(f"Process {i+1} finished\n")
 
+        for tier in tiers:
+            append_log_line(f"Starting {tier} pass\n")
+            work = queue.Queue()
+            for i, chunk in enumerate(chunks):
+                work.put((i, chunk))
+
+            def run_slot(slot):
+                while True:
+                    try:
+                        i, chunk = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    render_chunk(tier, i, chunk, slot)
+
+            threads = [threading.Thread(target=run_slot, args=(slot,), daemon=True) for slot in slots]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        journal.finish_run()
+        counts = journal.counts()
+        append_log_line(f"Rendered {counts['done']} materials, {counts['quarantined']} quarantined\n")
+        for tier, blend, name, error in journal.quarantined():
+            append_log_line(f"Quarantined ({tier}): {blend} {name or '(file)'}: {error}\n")
+
         def finish_render():
             props.is_rendering = False
             append_log_line("All rendering processes completed!\n")
@@ -169,6 +367,85 @@ class MATERIALPREVIEW_OT_start_render(Operator):
         bpy.app.timers.register(finish_render)
 
 
+class MATERIALPREVIEW_OT_calibrate(Operator):
+    bl_idname = "material_preview.calibrate"
+    bl_label = "Calibrate Workers"
+    bl_description = "Time a few worker and thread splits on the render scene and keep the fastest for this machine"
+
+    def execute(self, context):
+        props = context.scene.material_preview_props
+        if props.is_rendering:
+            self.report({'WARNING'}, "Render already in progress!")
+            return {'CANCELLED'}
+
+        render_scene_path = bpy.path.abspath(props.render_scene)
+        if not os.path.isfile(render_scene_path):
+            self.report({'ERROR'}, "Invalid render scene file")
+            return {'CANCELLED'}
+
+        clear_log()
+        props.is_rendering = True
+        threading.Thread(
+            target=self.run_calibration,
+            args=(render_scene_path, IMAGE_EXTS[props.image_type], props.pin_workers),
+            daemon=True
+        ).start()
+        return {'FINISHED'}
+
+    def run_calibration(self, render_scene_path, img_ext, pin):
+        props = bpy.context.scene.material_preview_props
+        render_script_path = os.path.join(os.path.dirname(__file__), "preview_renderer.py")
+        results = []
+
+        for workers in calibration_splits():
+            slots = plan_workers(workers)
+            procs = [
+                subprocess.Popen([
+                    bpy.app.binary_path, "--background", render_scene_path, "--python", render_script_path,
+                    "--", img_ext, "false", tempfile.gettempdir(), "--calibrate", str(CALIBRATION_RENDERS),
+                ] + slot_options(slot, pin), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+                for slot in slots
+            ]
+
+            # Read every worker at once so none blocks on a full pipe
+            outputs = [""] * len(procs)
+
+            def collect(index):
+                outputs[index] = procs[index].communicate()[0]
+
+            readers = [threading.Thread(target=collect, args=(i,), daemon=True) for i in range(len(procs))]
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+
+            per_minute = 0.0
+            for output in outputs:
+                for line in output.splitlines():
+                    marker = parse_marker(line)
+                    if marker and marker[0] == "CALIBRATED":
+                        renders, seconds = int(marker[1][0]), float(marker[1][1])
+                        if seconds > 0:
+                            per_minute += renders / seconds * 60.0
+
+            threads = slots[0]["threads"]
+            results.append({"workers": workers, "threads": threads, "per_minute": round(per_minute, 1)})
+            append_log_line(f"{workers} workers x {threads} threads: {per_minute:.1f} previews/min\n")
+
+        best = max(results, key=lambda result: result["per_minute"])
+        if best["per_minute"] > 0:
+            save_calibration(calibration_path(), best["workers"], results)
+            append_log_line(f"Using {best['workers']} workers x {best['threads']} threads from now on\n")
+        else:
+            append_log_line("Calibration failed, no worker finished its renders\n")
+
+        def finish_calibration():
+            props.is_rendering = False
+            return None
+
+        bpy.app.timers.register(finish_calibration)
+
+
 class MATERIALPREVIEW_PT_panel(Panel):
     bl_label = "Preview Renderer"
     bl_idname = "MATERIALPREVIEW_PT_panel"
@@ -188,10 +465,22 @@ class MATERIALPREVIEW_PT_panel(Panel):
         row = col.row()
         row.prop(props, "overwrite_all_previews")
         row.prop(props, "image_type")
+        col.prop(props, "progressive_render")
+        row = col.row()
+        row.prop(props, "worker_memory_limit_mb", text="Worker MB")
+        row.prop(props, "image_cache_mb", text="Texture Cache MB")
+        row = col.row()
+        row.prop(props, "material_timeout", text="Timeout (s)")
+        row.prop(props, "max_attempts", text="Attempts")
+        col.prop(props, "resume_render")
+        row = col.row()
+        row.prop(props, "render_workers", text="Workers")
+        row.prop(props, "pin_workers")
 
         row = layout.row()
         row.enabled = not props.is_rendering
         row.operator("material_preview.start_render")
+        row.operator("material_preview.calibrate", text="", icon='TIME')
 
         box = layout.box()
         col = box.column()
@@ -2,6 +2,23 @@ import bpy
 import os
 import sys
 import gc
+import time
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Run by a separate Blender process, so pull in shared helpers by path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import thumb_store
+import render_protocol
+import mirror_cache
+import render_scheduler
+import similarity
+import thumb_codec
+
+import numpy as np
 
 # --- CONFIGURATION ---
 
@@ -10,6 +27,17 @@ overwrite_all_previews = True
 IMG_TYPE = "JPEG"
 IMG_EXT = "jpg"
 RENDER_RES = 128
+FINAL_SAMPLES = 8
+DRAFT_SAMPLES = 1
+# Renders are read back from the compositor's viewer instead of a file
+VIEWER_IMAGE = "Viewer Node"
+# OpenColorIO color space matching each view transform on an sRGB display
+DISPLAY_SPACES = {
+    "Standard": "sRGB",
+    "Filmic": "Filmic sRGB",
+    "AgX": "AgX Base sRGB",
+    "Khronos PBR Neutral": "Khronos PBR Neutral sRGB",
+}
 
 # --- ARG PARSING ---
 
@@ -20,17 +48,47 @@ else:
     argv = []
 
 if len(argv) < 2:
-    print("Usage: blender --background --python render_previews_batch.py -- <jpg> <png> -- <True> <False> -- <blend_folder> <blend1.blend> <blend2.blend> ...")
+    print("Usage: blender --background --python render_previews_batch.py -- <jpg|png|pack> -- <True> <False> -- <blend_folder> <blend1.blend> <blend2.blend> ... [--tier draft|final]")
     sys.exit(1)
 
-IMG_EXT = argv[0].lower()
-overwrite_all_previews = argv[1].lower() == "true"
-BLEND_FOLDER = argv[2]
-blend_files = argv[3:]
+parser = argparse.ArgumentParser(prog="preview_renderer.py")
+parser.add_argument("img_ext")
+parser.add_argument("overwrite")
+parser.add_argument("blend_folder")
+parser.add_argument("blend_files", nargs="*")
+parser.add_argument(
+    "--tier", choices=["draft", "final"], default="final",
+    help="draft: minimum samples and simplified lighting, only fills missing thumbnails"
+)
+parser.add_argument("--max-rss-mb", type=int, default=0,
+                    help="Exit for a restart once resident memory passes this (0 = never)")
+parser.add_argument("--image-cache-mb", type=int, default=512,
+                    help="Memory budget for textures kept loaded for later materials")
+parser.add_argument("--skip-file", default="",
+                    help="JSON {blend: [materials]} already handled by a previous worker")
+parser.add_argument("--mirror-dir", default="",
+                    help="Read .blend files through this local mirror of the library folder")
+parser.add_argument("--mirror-quota-mb", type=int, default=mirror_cache.DEFAULT_QUOTA // (1024 * 1024))
+parser.add_argument("--threads", type=int, default=0,
+                    help="Render threads (0 = every CPU this process may use)")
+parser.add_argument("--cpus", default="",
+                    help="Comma-separated CPUs to pin this worker to")
+parser.add_argument("--calibrate", type=int, default=0,
+                    help="Only time this many renders of the scene as it is, for the launcher's calibration")
+args = parser.parse_args(argv)
+
+IMG_EXT = args.img_ext.lower()
+overwrite_all_previews = args.overwrite.lower() == "true"
+BLEND_FOLDER = args.blend_folder
+blend_files = args.blend_files
+TIER = args.tier
+MAX_RSS = args.max_rss_mb * 1024 * 1024
+SKIP = render_protocol.read_skip_file(args.skip_file)
+CPUS = render_scheduler.parse_cpus(args.cpus)
+MIRROR = mirror_cache.MirrorCache(args.mirror_dir, args.mirror_quota_mb * 1024 * 1024, enabled=bool(args.mirror_dir))
 
 # --- FUNCTIONS ---
-def safe_filename(name):
-    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+safe_filename = thumb_store.safe_filename
 
 def clear_existing_materials(obj):
     if obj.data.materials:
@@ -40,65 +98,347 @@ def clear_existing_materials(obj):
 def assign_material(obj, mat):
     obj.data.materials.append(mat)
 
-def render_preview(output_path):
+report_lock = threading.Lock()
+
+def report(kind, *fields):
+    # Thumbnails are saved on a thread, which reports too
+    with report_lock:
+        print(render_protocol.format_marker(kind, *fields), flush=True)
+
+def image_key(image):
+    if image.packed_file or image.source not in {'FILE', 'SEQUENCE', 'MOVIE', 'TILED'}:
+        return None
+    return os.path.normcase(os.path.normpath(bpy.path.abspath(image.filepath, library=image.library)))
+
+def image_bytes(image):
+    if not image.has_data:
+        return 0
+    width, height = image.size
+    return width * height * image.channels * (4 if image.is_float else 1)
+
+class ImageCache:
+    # Textures shared between materials stay loaded (fake user) up to a
+    # memory budget, least recently used first out.
+    def __init__(self, budget):
+        self.budget = budget
+        self.images = OrderedDict()
+        self.sizes = {}
+        self.total = 0
+
+    def adopt(self, new_images):
+        # Point freshly appended copies at the already loaded image
+        reused = 0
+        for image in new_images:
+            key = image_key(image)
+            cached = self.images.get(key) if key else None
+            if cached is None or cached == image:
+                continue
+            image.user_remap(cached)
+            bpy.data.images.remove(image)
+            self.images.move_to_end(key)
+            reused += 1
+        return reused
+
+    def keep(self, images):
+        for image in images:
+            key = image_key(image)
+            if not key:
+                continue
+            if key in self.images:
+                self.images.move_to_end(key)
+                continue
+            size = image_bytes(image)
+            if size == 0 or size > self.budget:
+                continue
+            image.use_fake_user = True
+            self.images[key] = image
+            self.sizes[key] = size
+            self.total += size
+        self.evict()
+
+    def evict(self):
+        while self.total > self.budget and self.images:
+            key, image = self.images.popitem(last=False)
+            self.total -= self.sizes.pop(key)
+            try:
+                image.use_fake_user = False
+                if image.users == 0:
+                    bpy.data.images.remove(image)
+            except ReferenceError:
+                pass
+
+image_cache = ImageCache(args.image_cache_mb * 1024 * 1024)
+
+TRACKED_DATA = ("images", "node_groups", "textures")
+
+def snapshot_data():
+    return {name: set(getattr(bpy.data, name)) for name in TRACKED_DATA}
+
+def new_data_since(before):
+    return {name: set(getattr(bpy.data, name)) - before[name] for name in TRACKED_DATA}
+
+def release_job_data(new_data):
+    # Keep reusable textures, then drop everything else the job brought in
+    alive = []
+    for image in new_data["images"]:
+        try:
+            image.name
+        except ReferenceError:
+            # Replaced by a cached copy in ImageCache.adopt
+            continue
+        alive.append(image)
+    image_cache.keep(alive)
+    bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+
+def check_memory():
+    if not MAX_RSS:
+        return
+    rss = render_protocol.process_rss_bytes()
+    if rss > MAX_RSS:
+        thumb_writer.wait()
+        report("RECYCLE", rss // (1024 * 1024))
+        sys.stdout.flush()
+        # Skip Blender's own teardown; the launcher starts a fresh worker
+        os._exit(render_protocol.RECYCLE_EXIT_CODE)
+
+def setup_capture(scene):
+    # Route the render through a viewer node, converted to display colors,
+    # so its pixels can be read without writing and decoding a file.
+    # Returns False when the view can't be reproduced there.
+    view = scene.view_settings
+    display_space = DISPLAY_SPACES.get(view.view_transform)
+    if display_space is None or view.look not in {"None", ""} or view.exposure or view.gamma != 1.0:
+        return False
+
+    alpha = None
+    if scene.use_nodes and scene.node_tree:
+        # The render scene composites: view what goes to its output
+        tree = scene.node_tree
+        composite = next((node for node in tree.nodes if node.type == 'COMPOSITE'), None)
+        if composite is None or not composite.inputs["Image"].is_linked:
+            return False
+        image = composite.inputs["Image"].links[0].from_socket
+    else:
+        scene.use_nodes = True
+        tree = scene.node_tree
+        tree.nodes.clear()
+        layers = tree.nodes.new("CompositorNodeRLayers")
+        composite = tree.nodes.new("CompositorNodeComposite")
+        tree.links.new(layers.outputs["Image"], composite.inputs["Image"])
+        image, alpha = layers.outputs["Image"], layers.outputs["Alpha"]
+    scene.render.use_compositing = True
+
+    convert = tree.nodes.new("CompositorNodeConvertColorSpace")
+    viewer = tree.nodes.new("CompositorNodeViewer")
+    try:
+        convert.from_color_space = "Linear Rec.709"
+        convert.to_color_space = display_space
+    except TypeError:
+        # Not in this Blender's color configuration
+        return False
+    tree.links.new(image, convert.inputs["Image"])
+    tree.links.new(convert.outputs["Image"], viewer.inputs["Image"])
+    if alpha is not None and "Alpha" in viewer.inputs:
+        tree.links.new(alpha, viewer.inputs["Alpha"])
+    return True
+
+def render_preview(output_path=None):
+    # Without a path the render stays in memory and its pixels are returned
+    if output_path is None:
+        bpy.ops.render.render()
+        return captured_pixels()
     bpy.context.scene.render.filepath = output_path
     bpy.ops.render.render(write_still=True)
     print(f"Rendered preview: {output_path}")
 
+def captured_pixels():
+    # (h, w, 4) float display colors, bottom row first
+    viewer = bpy.data.images.get(VIEWER_IMAGE)
+    if viewer is None or tuple(viewer.size) != (RENDER_RES, RENDER_RES):
+        raise CaptureUnavailable("the compositor left no viewer image")
+    pixels = np.empty(RENDER_RES * RENDER_RES * 4, dtype=np.float32)
+    viewer.pixels.foreach_get(pixels)
+    return pixels.reshape(RENDER_RES, RENDER_RES, 4)
+
+class CaptureUnavailable(RuntimeError):
+    pass
+
+def remap_mirrored_images(images):
+    # Textures are not mirrored: point relative paths that now resolve next
+    # to the mirror copy back at the library folder
+    for image in images:
+        if image.library or image.packed_file or not image.filepath:
+            continue
+        path = os.path.normpath(bpy.path.abspath(image.filepath))
+        canonical = MIRROR.canonical(path)
+        if canonical != path:
+            image.filepath = canonical
+
+def thumbnail_pixels(path):
+    # Decode a render written to disk, for the fallback path
+    image = bpy.data.images.load(path, check_existing=False)
+    try:
+        width, height = image.size
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+        return pixels.reshape(height, width, 4)
+    finally:
+        bpy.data.images.remove(image)
+
+def save_thumbnail(blend_filename, manifest, mat_name, pixels, stored=None):
+    # Runs on the writer thread: no bpy in here. `stored` is the (hash, ext)
+    # of a file Blender already wrote into the store.
+    try:
+        height, width = pixels.shape[:2]
+        # Color histogram for "find similar" in the browser
+        colors = similarity.color_histogram(pixels)
+        if stored:
+            digest = stored[0]
+        elif IMG_EXT == thumb_store.PACK_EXT:
+            rgba = thumb_codec.to_rgba8(pixels).tobytes()
+            digest = thumb_store.append_to_pack(BLEND_FOLDER, blend_filename, width, height, rgba)
+        else:
+            # PNG rows run top to bottom
+            digest = thumb_store.store_bytes(BLEND_FOLDER, thumb_codec.encode_png(pixels[::-1]), IMG_EXT)
+        thumb_store.set_thumbnail(manifest, mat_name, digest, IMG_EXT, tier=TIER, colors=colors)
+        thumb_store.save_manifest(BLEND_FOLDER, blend_filename, manifest)
+    except Exception as e:
+        print(f"⚠️ Failed to save the thumbnail of {mat_name}: {e}")
+        report("FAIL", blend_filename, mat_name, str(e))
+        return
+    report("DONE", blend_filename, mat_name)
+
+class ThumbWriter:
+    # Encodes and stores each render on a thread while the next material
+    # renders. One save in flight at a time keeps manifest saves in order.
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+
+    def submit(self, *job):
+        self.wait()
+        self.pending = self.executor.submit(save_thumbnail, *job)
+
+    def wait(self):
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+
+thumb_writer = ThumbWriter()
+
+def render_material(blend_path, mat_name, output_file, label):
+    before = snapshot_data()
+    with bpy.data.libraries.load(blend_path, link=False) as (_, data_to):
+        data_to.materials = [mat_name]
+
+    mat = data_to.materials[0] if data_to.materials else None
+    if mat is None:
+        raise RuntimeError("material could not be appended")
+
+    new_data = new_data_since(before)
+    remap_mirrored_images(new_data["images"])
+    reused = image_cache.adopt(new_data["images"])
+    if reused:
+        print(f"[{label}] Reusing {reused} cached textures")
+
+    cube = bpy.data.objects[TARGET_OBJECT_NAME]
+    try:
+        clear_existing_materials(cube)
+        assign_material(cube, mat)
+        return render_preview(output_file)
+    finally:
+        clear_existing_materials(cube)
+        bpy.data.materials.remove(mat)
+        release_job_data(new_data)
+        gc.collect()
+
+def render_thumbnail(blend_path, mat_name, scratch_path, label):
+    # Returns (pixels, stored) for the writer thread
+    global CAPTURE
+    if CAPTURE:
+        try:
+            return render_material(blend_path, mat_name, None, label), None
+        except CaptureUnavailable as e:
+            print(f"Reading renders from memory failed ({e}), writing files instead")
+            CAPTURE = False
+
+    output_file = os.path.join(scratch_path, f"{os.getpid()}_{safe_filename(mat_name)}.{FILE_EXT}")
+    render_material(blend_path, mat_name, output_file, label)
+    pixels = thumbnail_pixels(output_file)
+    if IMG_EXT == "jpg":
+        # Hash into the shared store; identical renders end up as one file
+        return pixels, thumb_store.store_file(BLEND_FOLDER, output_file, move=True)
+    os.remove(output_file)
+    return pixels, None
+
 def process_blend_file(blend_filename):
-    blend_path = os.path.join(BLEND_FOLDER, blend_filename)
+    # The local mirror copy when mirroring is on; thumbnails and manifests
+    # are still written to the library folder
+    blend_path = MIRROR.fetch(os.path.join(BLEND_FOLDER, blend_filename))
     blend_name = os.path.splitext(blend_filename)[0]
-    preview_output_path = os.path.join(BLEND_FOLDER, f"{blend_name}_Data", "previews")
+    scratch_path = thumb_store.scratch_folder(BLEND_FOLDER)
+    manifest = thumb_store.load_manifest(BLEND_FOLDER, blend_filename)
 
-    os.makedirs(preview_output_path, exist_ok=True)
+    os.makedirs(scratch_path, exist_ok=True)
 
-    # Load all materials from the blend file
-    with bpy.data.libraries.load(blend_path, link=False) as (data_from, _):
-        material_names = [name for name in data_from.materials if name]
-
-    # Get the cube object
+    # Get the cube object. Checked before QUEUE: a queued file counts as
+    # opened, which would clear this failure and retry it forever
     cube = bpy.data.objects.get(TARGET_OBJECT_NAME)
     if not cube:
         print(f"Cube object '{TARGET_OBJECT_NAME}' not found!")
+        report("FAIL", blend_filename, "", f"render scene has no '{TARGET_OBJECT_NAME}' object")
+        return
+
+    # Load all materials from the blend file
+    try:
+        with bpy.data.libraries.load(blend_path, link=False) as (data_from, _):
+            material_names = [name for name in data_from.materials if name]
+    except Exception as e:
+        print(f"⚠️ Failed to open {blend_filename}: {e}")
+        report("FAIL", blend_filename, "", str(e))
         return
+    report("QUEUE", blend_filename, *material_names)
 
     print(f"Processing {blend_filename} with {len(material_names)} materials")
+    skip = SKIP.get(blend_filename, set())
 
     for i, mat_name in enumerate(material_names, 1):
-        output_file = os.path.join(preview_output_path, f"{safe_filename(mat_name)}.{IMG_EXT}")
-        alt_ext = "png" if IMG_EXT == "jpg" else "jpg"
-        alt_file = os.path.join(preview_output_path, f"{safe_filename(mat_name)}.{alt_ext}")
-
-        # Handle overwrite and cleanup
-        # if overwrite_all_previews:
-            # Delete opposite format if it exists
-        if os.path.exists(alt_file):
-            os.remove(alt_file)
-            print(f"[{blend_name}] Removed outdated: {os.path.basename(alt_file)}")
-        # else:
-        #     if os.path.exists(output_file):
-        #         print(f"[{blend_name}] Skipping existing: {mat_name}")
-        #         continue
-
-        output_file = os.path.join(preview_output_path, f"{safe_filename(mat_name)}.{IMG_EXT}")
-        if not overwrite_all_previews and os.path.exists(output_file):
-            print(f"[{blend_name}] Skipping existing: {mat_name}")
+        if mat_name in skip:
             continue
 
-        with bpy.data.libraries.load(blend_path, link=False) as (_, data_to):
-            data_to.materials = [mat_name]
-
-        mat = bpy.data.materials.get(mat_name)
-        if mat is None:
-            print(f"⚠️ Failed to load material: {mat_name}")
+        report("START", blend_filename, mat_name)
+        existing = manifest["materials"].get(mat_name)
+        if existing and existing.get("tier") == "swatch":
+            # Index-time placeholder, any render replaces it
+            existing = None
+        if TIER == "draft":
+            # Drafts only fill gaps, never replace an existing thumbnail
+            if existing:
+                report("DONE", blend_filename, mat_name)
+                continue
+        elif not overwrite_all_previews and existing and existing.get("ext") == IMG_EXT \
+                and existing.get("tier", "final") == "final":
+            # A thumbnail in the other format or still a draft counts as outdated
+            print(f"[{blend_name}] Skipping existing: {mat_name}")
+            report("DONE", blend_filename, mat_name)
             continue
 
         print(f"[{blend_name}] Rendering {mat_name} ({i}/{len(material_names)})")
-        clear_existing_materials(cube)
-        assign_material(cube, mat)
-        render_preview(output_file)
-        bpy.data.materials.remove(mat)
-        gc.collect()
+        try:
+            pixels, stored = render_thumbnail(blend_path, mat_name, scratch_path, blend_name)
+        except Exception as e:
+            # The launcher retries it later or quarantines it
+            print(f"⚠️ Failed to render {mat_name}: {e}")
+            report("FAIL", blend_filename, mat_name, str(e))
+            check_memory()
+            continue
+
+        # Saved and reported DONE on the writer thread
+        thumb_writer.submit(blend_filename, manifest, mat_name, pixels, stored)
+        check_memory()
+
+    thumb_writer.wait()
+    report("BLEND_DONE", blend_filename)
 
 # --- SETUP RENDER SETTINGS ---
 
@@ -107,24 +447,61 @@ scene.render.engine = 'BLENDER_EEVEE_NEXT'
 scene.render.resolution_x = RENDER_RES
 scene.render.resolution_y = RENDER_RES
 scene.render.resolution_percentage = 100
+FILE_EXT = IMG_EXT
 if IMG_EXT == "jpg":
     scene.render.image_settings.file_format = IMG_TYPE
     IMG_TYPE = "JPEG"
     scene.render.film_transparent = False
     scene.render.image_settings.quality = 90
-elif IMG_EXT == "png":
+else:
+    # PNG, and packs when rendering to a file is the fallback
+    FILE_EXT = "png"
     IMG_TYPE = "PNG"
     scene.render.image_settings.file_format = IMG_TYPE
     scene.render.image_settings.color_mode = 'RGBA'
+# JPEGs come straight from Blender's encoder; everything else is read from
+# memory and encoded or packed on the writer thread
+CAPTURE = IMG_EXT != "jpg" and setup_capture(scene)
+if IMG_EXT != "jpg" and not CAPTURE:
+    print("The render scene's color view can't be read from memory, writing files instead")
 
 # scene.render.image_settings.file_format = IMG_TYPE
-scene.eevee.taa_render_samples = 8
+if TIER == "draft":
+    scene.eevee.taa_render_samples = DRAFT_SAMPLES
+    # Simplified lighting; attributes differ between EEVEE versions
+    for attr in ("use_raytracing", "use_shadows", "use_gtao", "use_ssr", "use_bloom", "use_volumetric_shadows"):
+        if hasattr(scene.eevee, attr):
+            setattr(scene.eevee, attr, False)
+else:
+    scene.eevee.taa_render_samples = FINAL_SAMPLES
+# The launcher splits the cores between concurrently running workers
+if CPUS and not render_scheduler.pin_to(CPUS):
+    print("CPU pinning is not supported here, running unpinned")
 scene.render.threads_mode = 'FIXED'
-scene.render.threads = max(1, os.cpu_count())
+scene.render.threads = args.threads or len(render_scheduler.available_cpus())
+
+if args.calibrate:
+    output_file = os.path.join(tempfile.gettempdir(), f"tmg_calibrate_{os.getpid()}.{FILE_EXT}")
+    if CAPTURE:
+        try:
+            render_preview()
+            output_file = None
+        except CaptureUnavailable:
+            pass
+    # The first render compiles shaders, which a real run pays only once
+    render_preview(output_file)
+    start = time.perf_counter()
+    for _ in range(args.calibrate):
+        render_preview(output_file)
+    report("CALIBRATED", args.calibrate, f"{time.perf_counter() - start:.4f}")
+    if output_file and os.path.exists(output_file):
+        os.remove(output_file)
+    sys.stdout.flush()
+    sys.exit(0)
 
 # --- MAIN PROCESS ---
 
-print(f"Starting batch rendering for {len(blend_files)} blend files")
+print(f"Starting {TIER} batch rendering for {len(blend_files)} blend files")
 
 for blend_file in blend_files:
     process_blend_file(blend_file)
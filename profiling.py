@@ -0,0 +1,168 @@
+# Opt-in timing instrumentation for the browser and renderer.
+#
+# Kept free of bpy so it can be imported by the benchmarks and the render
+# worker scripts as well as the add-on. When disabled, instrumented calls cost
+# a single attribute check.
+
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+
+PROFILE_ENV = "TMG_MATERIAL_BROWSER_PROFILE"
+
+
+class SectionTiming:
+    __slots__ = ("items",)
+
+    def __init__(self):
+        self.items = 0
+
+
+class SectionStats:
+    __slots__ = ("calls", "total", "max", "items", "samples")
+
+    def __init__(self, max_samples):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.items = 0
+        self.samples = deque(maxlen=max_samples)
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Profiler:
+    def __init__(self, max_samples=1024, max_events=20000):
+        self.enabled = os.environ.get(PROFILE_ENV, "") not in {"", "0"}
+        self.max_samples = max_samples
+        self._sections = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def record(self, name, start, end, items=0):
+        duration = end - start
+        with self._lock:
+            stats = self._sections.get(name)
+            if stats is None:
+                stats = self._sections[name] = SectionStats(self.max_samples)
+            stats.calls += 1
+            stats.total += duration
+            stats.items += items
+            if duration > stats.max:
+                stats.max = duration
+            stats.samples.append(duration)
+            self._events.append((name, start, duration, items, threading.get_ident()))
+
+    def section(self, name):
+        return _Section(self, name)
+
+    def reset(self):
+        with self._lock:
+            self._sections.clear()
+            self._events.clear()
+            self._origin = time.perf_counter()
+
+    def stats(self):
+        with self._lock:
+            snapshot = {name: (s.calls, s.total, s.max, s.items, sorted(s.samples))
+                        for name, s in self._sections.items()}
+
+        result = {}
+        for name, (calls, total, longest, items, ordered) in snapshot.items():
+            result[name] = {
+                "calls": calls,
+                "total_ms": total * 1000.0,
+                "mean_ms": total / calls * 1000.0 if calls else 0.0,
+                "p50_ms": _percentile(ordered, 0.50) * 1000.0,
+                "p90_ms": _percentile(ordered, 0.90) * 1000.0,
+                "p99_ms": _percentile(ordered, 0.99) * 1000.0,
+                "max_ms": longest * 1000.0,
+                "items": items,
+            }
+        return result
+
+    def chrome_trace(self):
+        # Complete ("X") events, loadable in chrome://tracing or Perfetto
+        with self._lock:
+            events = list(self._events)
+            origin = self._origin
+
+        pid = os.getpid()
+        trace = [{
+            "name": name,
+            "cat": "material_browser",
+            "ph": "X",
+            "ts": (start - origin) * 1e6,
+            "dur": duration * 1e6,
+            "pid": pid,
+            "tid": tid,
+            "args": {"items": items},
+        } for name, start, duration, items, tid in events]
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def export(self, filepath, fmt="JSON"):
+        data = self.chrome_trace() if fmt == "CHROME" else {"sections": self.stats()}
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+
+class _Section:
+    __slots__ = ("profiler", "name", "timing", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.timing = SectionTiming()
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.timing
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler.enabled:
+            self.profiler.record(self.name, self.start, time.perf_counter(), self.timing.items)
+        return False
+
+
+PROFILER = Profiler()
+
+
+def profiled(name, count=None):
+    """Time every call of the decorated function while profiling is enabled.
+
+    `count(result, *args, **kwargs)` returns the number of items the call
+    processed, e.g. materials parsed or rows filtered.
+
+    Not for functions Blender calls back (draw, execute, property updates):
+    Blender checks their argument count, which the wrapper hides. Time
+    their bodies with PROFILER.section() instead.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            end = time.perf_counter()
+            items = 0
+            if count is not None:
+                try:
+                    items = count(result, *args, **kwargs)
+                except Exception:
+                    items = 0
+            PROFILER.record(name, start, end, items)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,371 @@
+import bpy
+import os
+import time
+import queue
+import threading
+
+from . import material_list as ml
+from .profiling import profiled
+from .fsio import FS
+from .thumb_store import (
+    load_manifest, save_manifest, ingest_legacy_previews, collect_garbage, compact_pack, PACK_EXT
+)
+from .swatches import missing_swatches, add_flat_swatches, add_texture_swatch
+from .material_costs import measure_images
+
+# Work done per timer tick on the UI thread
+TICK_INTERVAL = 0.05
+TICK_BUDGET = 0.02
+ITEM_BATCH = 500
+FILTER_INTERVAL = 0.5
+
+active_jobs = {}
+
+
+class RefreshJob:
+    """Index a material folder without blocking the UI.
+
+    A background thread reads index JSON files, manifests and legacy previews.
+    Anything that needs bpy (parsing .blend files, filling the scene
+    collections, loading previews) is handed back to a timer and done in
+    small batches, so the partial list stays usable while the job runs. A
+    parsed library goes back to the thread to have its textures measured
+    and its index written.
+    """
+
+    def __init__(self, scene, folder_path, force=False):
+        self.scene = scene
+        self.folder_path = folder_path
+        self.force = force
+        if force:
+            # An explicit refresh always looks at the disk again
+            FS.invalidate()
+        self.blend_files = [f for f in FS.listdir(folder_path) if f.lower().endswith(".blend")]
+
+        self.work = queue.Queue()
+        self.results = queue.Queue()
+        self.cancelled = threading.Event()
+        self.thread = None
+
+        self.pending_entries = []
+        # Texture swatches still to decode: (blend file, name, base color)
+        self.swatch_queue = []
+        self.swatch_tiles = {}
+        self.manifests = {}
+        self.indexed = 0
+        self.thumbs_done = 0
+        self.thread_done = False
+        self.finished = False
+        self.status = "Starting"
+        self.started_at = 0.0
+        self.last_filter = 0.0
+
+    # ---------- Progress ----------
+    @property
+    def total_units(self):
+        return max(1, len(self.blend_files) * 2)
+
+    @property
+    def progress(self):
+        return min(1.0, (self.indexed + self.thumbs_done) / self.total_units)
+
+    @property
+    def eta(self):
+        done = self.indexed + self.thumbs_done
+        if done == 0:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return elapsed / done * (self.total_units - done)
+
+    def progress_text(self):
+        text = f"{self.status} {self.indexed}/{len(self.blend_files)}"
+        eta = self.eta
+        if eta is not None and not self.finished:
+            text += f"  ETA {eta:.0f}s"
+        return text
+
+    # ---------- Background thread ----------
+    def worker(self):
+        remaining = len(self.blend_files)
+        while remaining and not self.cancelled.is_set():
+            try:
+                task = self.work.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            kind, blend_file = task[0], task[1]
+            json_path = ml.index_path(self.folder_path, blend_file)
+
+            if kind == "scan":
+                # Reused as long as it was built from this exact .blend, by
+                # whoever indexed it first
+                stamp = ml.blend_stamp(os.path.join(self.folder_path, blend_file))
+                try:
+                    mtime = FS.mtime_ns(json_path)
+                except OSError:
+                    mtime = None
+                entries, generation, source = ml.read_index(json_path)
+                if source is None or source != stamp:
+                    # .blend parsing needs bpy, so it goes back to the timer
+                    self.results.put(("parse", blend_file, (json_path, stamp)))
+                    continue
+                for entry in entries:
+                    entry["blend_file"] = blend_file
+                self.results.put(("entries", blend_file, (entries, mtime, generation)))
+                self.work.put(("thumbs", blend_file, base_colors(entries)))
+
+            elif kind == "measure":
+                # Texture sizes and headers, which the UI thread's parse
+                # leaves out: a stat and a read per file on a network share
+                entries, stamp = task[2]
+                measure_images([entry["cost"] for entry in entries if entry.get("cost")])
+                entries, generation = ml.write_index(json_path, entries, stamp)
+                for entry in entries:
+                    entry["blend_file"] = blend_file
+                self.results.put(("entries", blend_file, (entries, None, generation)))
+                self.work.put(("thumbs", blend_file, base_colors(entries)))
+
+            elif kind == "thumbs":
+                manifest = load_manifest(self.folder_path, blend_file)
+                textured = []
+                try:
+                    changed = ingest_legacy_previews(self.folder_path, blend_file, list(task[2]), manifest)
+                    # Placeholders for everything that has no thumbnail at all
+                    flat, textured = missing_swatches(manifest, task[2])
+                    if add_flat_swatches(self.folder_path, manifest, flat) or changed:
+                        save_manifest(self.folder_path, blend_file, manifest)
+                except OSError as e:
+                    print(f"[MaterialBrowser] Failed to update thumbnails for {blend_file}: {e}")
+                self.results.put(("thumbs", blend_file, (manifest, textured)))
+                remaining -= 1
+
+        if self.force and not self.cancelled.is_set():
+            manifests = [load_manifest(self.folder_path, blend_file) for blend_file in self.blend_files]
+            removed = collect_garbage(self.folder_path, manifests)
+            for blend_file, manifest in zip(self.blend_files, manifests):
+                packed = {entry["hash"] for entry in manifest["materials"].values() if entry.get("ext") == PACK_EXT}
+                removed += compact_pack(self.folder_path, blend_file, packed)
+            if removed:
+                print(f"[MaterialBrowser] Removed {removed} unused thumbnails")
+
+        self.results.put(("done", None, None))
+
+    # ---------- UI thread ----------
+    def start(self):
+        ml.material_store.clear(self.folder_path)
+        ml.index_state.clear()
+        ml.set_list_rows([])
+        ml.search_cache.clear()
+        ml.preview_keys.clear()
+        ml.thumb_colors.clear()
+
+        ml.clear_preview_collection()
+        ml.preview_collections["material_thumbs"] = bpy.utils.previews.new()
+
+        for blend_file in self.blend_files:
+            self.work.put(("scan", blend_file))
+
+        self.started_at = time.monotonic()
+        self.status = "Indexing"
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.status = "Cancelled"
+
+    @profiled("RefreshJob.tick")
+    def tick(self, budget=TICK_BUDGET):
+        """Apply finished work. Returns True once the job is over."""
+        deadline = time.perf_counter() + budget if budget else None
+        parsed = False
+
+        while not self.cancelled.is_set():
+            if deadline and time.perf_counter() > deadline:
+                break
+            try:
+                kind, blend_file, payload = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "parse":
+                if parsed and deadline:
+                    # One .blend per tick keeps each tick short
+                    self.results.put((kind, blend_file, payload))
+                    break
+                parsed = True
+                self.status = "Parsing"
+                json_path, stamp = payload
+                # Another client may have indexed it since the scan
+                entries, generation, source = ml.read_index(json_path)
+                if source is None or source != stamp:
+                    try:
+                        entries = ml.parse_blend_file(os.path.join(self.folder_path, blend_file))
+                    except Exception as e:
+                        # A corrupt or unreadable library counts as indexed,
+                        # empty, so the job still gets to the end
+                        print(f"[MaterialBrowser] Failed to index {blend_file}: {e}")
+                        self.indexed += 1
+                        self.work.put(("thumbs", blend_file, {}))
+                        continue
+                    # Comes back as "entries" once its textures are measured
+                    self.work.put(("measure", blend_file, (entries, stamp)))
+                    continue
+                for entry in entries:
+                    entry["blend_file"] = blend_file
+                ml.index_state[blend_file] = (None, generation)
+                self.pending_entries.extend(entries)
+                self.indexed += 1
+                self.work.put(("thumbs", blend_file, base_colors(entries)))
+
+            elif kind == "entries":
+                entries, mtime, generation = payload
+                ml.index_state[blend_file] = (mtime, generation)
+                self.pending_entries.extend(entries)
+                self.indexed += 1
+
+            elif kind == "thumbs":
+                manifest, textured = payload
+                self.manifests[blend_file] = manifest
+                self.swatch_queue.extend((blend_file, name, base_color) for name, base_color in textured)
+                pcoll = ml.preview_collections.get("material_thumbs")
+                if pcoll is not None:
+                    ml.load_manifest_previews(pcoll, self.folder_path, blend_file, manifest)
+                self.thumbs_done += 1
+
+            elif kind == "done":
+                self.thread_done = True
+
+        if self.swatch_queue and not self.cancelled.is_set() and not self.pending_entries:
+            self.make_texture_swatches(deadline)
+
+        if self.pending_entries and not self.cancelled.is_set():
+            size = len(self.pending_entries) if not deadline else ITEM_BATCH
+            batch = self.pending_entries[:size]
+            del self.pending_entries[:size]
+            ml.add_material_items(self.scene, batch)
+            self.scene.material_browser_material_count = f"Materials: {len(ml.material_store)}"
+
+            now = time.monotonic()
+            if not deadline or now - self.last_filter > FILTER_INTERVAL:
+                self.last_filter = now
+                ml.filter_material_browser_items(self.scene, keep_selection=True)
+
+        if self.cancelled.is_set() or (self.thread_done and not self.pending_entries
+                                       and not self.swatch_queue and self.results.empty()):
+            self.finish()
+            return True
+        return False
+
+    def make_texture_swatches(self, deadline):
+        # Decoding needs bpy, so it happens here, a few per tick
+        self.status = "Swatches"
+        changed = set()
+        while self.swatch_queue:
+            blend_file, name, base_color = self.swatch_queue.pop(0)
+            manifest = self.manifests[blend_file]
+            if name not in manifest["materials"]:
+                try:
+                    add_texture_swatch(self.folder_path, manifest, name, base_color, self.swatch_tiles)
+                    changed.add(blend_file)
+                except OSError as e:
+                    print(f"[MaterialBrowser] Failed to store swatch for {name}: {e}")
+            if deadline and time.perf_counter() > deadline:
+                break
+
+        pcoll = ml.preview_collections.get("material_thumbs")
+        for blend_file in changed:
+            manifest = self.manifests[blend_file]
+            save_manifest(self.folder_path, blend_file, manifest)
+            if pcoll is not None:
+                ml.load_manifest_previews(pcoll, self.folder_path, blend_file, manifest)
+
+    def finish(self):
+        self.finished = True
+        scene = self.scene
+        ml.filter_material_browser_items(scene, keep_selection=True)
+        first = ml.get_active_record(scene)
+        if first is not None:
+            scene.material_browser_selected_material = first.name
+
+        if not self.cancelled.is_set():
+            self.status = "Done"
+            print(f"[MaterialBrowser] Indexed {len(ml.material_store)} materials "
+                  f"in {time.monotonic() - self.started_at:.1f}s")
+        else:
+            print(f"[MaterialBrowser] Refresh cancelled after {len(ml.material_store)} materials")
+
+    def run_blocking(self):
+        self.start()
+        while not self.tick(budget=None):
+            time.sleep(0.001)
+
+
+def base_colors(entries):
+    return {entry.get("name", ""): (entry.get("cost") or {}).get("base_color") for entry in entries}
+
+
+def redraw_panels():
+    try:
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+    except Exception:
+        pass
+
+
+def get_job(scene):
+    return active_jobs.get(scene.name)
+
+
+def cancel_job(scene):
+    job = active_jobs.get(scene.name)
+    if job and not job.finished:
+        job.cancel()
+
+
+def cancel_all_jobs():
+    for job in active_jobs.values():
+        if not job.finished:
+            job.cancel()
+    active_jobs.clear()
+
+
+def start_refresh(scene, folder_path, force=False):
+    """Start (or restart) indexing `folder_path` into `scene`."""
+    cancel_job(scene)
+    job = RefreshJob(scene, folder_path, force=force)
+    active_jobs[scene.name] = job
+
+    if bpy.app.background:
+        # No event loop to drive timers, so run to completion
+        job.run_blocking()
+        return job
+
+    job.start()
+
+    def timer():
+        if active_jobs.get(job.scene.name) is not job:
+            job.cancel()
+            return None
+        try:
+            done = job.tick()
+        except ReferenceError:
+            # Scene went away (file loaded, scene deleted)
+            job.cancel()
+            return None
+        except Exception as e:
+            # Stop the worker thread too, and show what was indexed so far
+            print(f"[MaterialBrowser] Refresh failed: {e}")
+            job.cancel()
+            try:
+                job.finish()
+            except Exception:
+                pass
+            return None
+        redraw_panels()
+        return None if done else TICK_INTERVAL
+
+    bpy.app.timers.register(timer, first_interval=TICK_INTERVAL)
+    return job
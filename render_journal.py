@@ -0,0 +1,240 @@
+# Persistent job journal for preview render runs.
+#
+# Every state change is appended as one JSON line and fsync'd, so a crash of
+# a worker, of the launcher or of the whole machine loses at most the line
+# being written. Replaying the file rebuilds the state of every job, which
+# lets an interrupted run resume exactly where it stopped. A job for the
+# material name "" stands for a .blend file that could not be opened at all.
+# Kept free of bpy.
+
+import os
+import json
+import time
+import tempfile
+import threading
+
+JOURNAL_NAME = "_render_journal.jsonl"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+QUARANTINED = "quarantined"
+
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 5.0
+
+
+def journal_path(blend_folder):
+    return os.path.join(blend_folder, JOURNAL_NAME)
+
+
+def retry_delay(attempts):
+    return RETRY_BASE_DELAY * (2 ** max(0, attempts - 1))
+
+
+class RenderJournal:
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.settings = {}
+        self.complete = False
+        # (tier, blend) -> {material: job dict}
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._replay()
+
+    # ---------- Persistence ----------
+    def _replay(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # Torn last line from a crash mid-write
+                continue
+            self._apply(event)
+
+        # Jobs that were running when the launcher died get another go
+        for jobs in self.jobs.values():
+            for job in jobs.values():
+                if job["state"] == RUNNING:
+                    job["state"] = QUEUED
+
+    def _apply(self, event):
+        kind = event.get("event")
+        if kind == "run":
+            self.settings = event.get("settings", {})
+            self.complete = False
+            return
+        if kind == "complete":
+            self.complete = True
+            return
+
+        key = (event["tier"], event["blend"])
+        jobs = self.jobs.setdefault(key, {})
+        if kind == "queue":
+            # The file opened after all: an earlier whole-file failure is
+            # settled, but keeps its attempts in case it comes back
+            if jobs.get("", {}).get("state") in (QUEUED, FAILED):
+                jobs[""]["state"] = DONE
+            # Materials deleted from the file since the last run are dropped
+            names = set(event["materials"])
+            for name in [name for name in jobs if name and name not in names]:
+                del jobs[name]
+            for name in event["materials"]:
+                jobs.setdefault(name, {"state": QUEUED, "attempts": 0, "retry_at": 0.0, "error": ""})
+            return
+
+        job = jobs.setdefault(event["material"], {"state": QUEUED, "attempts": 0, "retry_at": 0.0, "error": ""})
+        if kind == "start":
+            job["state"] = RUNNING
+        elif kind == "done":
+            job["state"] = DONE
+        elif kind == "fail":
+            job["attempts"] += 1
+            job["error"] = event.get("error", "")
+            if job["attempts"] >= self.max_attempts:
+                job["state"] = QUARANTINED
+            else:
+                job["state"] = FAILED
+                job["retry_at"] = event.get("time", 0.0) + retry_delay(job["attempts"])
+
+    def _write(self, event):
+        event["time"] = time.time()
+        with self._lock:
+            self._apply(event)
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def compact(self):
+        """Rewrite the journal as a snapshot of the current state."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            now = time.time()
+            lines = [{"event": "run", "settings": self.settings, "time": now}]
+            for (tier, blend), jobs in self.jobs.items():
+                lines.append({"event": "queue", "tier": tier, "blend": blend,
+                              "materials": [name for name in jobs if name], "time": now})
+                for name, job in jobs.items():
+                    base = {"tier": tier, "blend": blend, "material": name}
+                    # Failures are replayed one by one to restore attempts
+                    for _ in range(job["attempts"]):
+                        retry_from = job["retry_at"] - retry_delay(job["attempts"])
+                        lines.append(dict(base, event="fail", error=job["error"], time=retry_from))
+                    if job["state"] == DONE:
+                        lines.append(dict(base, event="done", time=now))
+            if self.complete:
+                lines.append({"event": "complete", "time": now})
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_journal_")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(json.dumps(line) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    # ---------- Events ----------
+    def begin_run(self, settings, resume=True):
+        """Start a run, or continue the previous one if it was interrupted
+        with the same settings. Returns True when resuming."""
+        resuming = resume and not self.complete and self.jobs and self.settings == settings
+        if not resuming:
+            self.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.jobs.clear()
+            self.complete = False
+        self._write({"event": "run", "settings": settings})
+        return bool(resuming)
+
+    def queue(self, tier, blend, materials):
+        known = self.jobs.get((tier, blend))
+        if known is None or set(materials) != {name for name in known if name} \
+                or known.get("", {}).get("state") in (QUEUED, FAILED):
+            self._write({"event": "queue", "tier": tier, "blend": blend, "materials": list(materials)})
+
+    def start(self, tier, blend, material):
+        self._write({"event": "start", "tier": tier, "blend": blend, "material": material})
+
+    def done(self, tier, blend, material):
+        self._write({"event": "done", "tier": tier, "blend": blend, "material": material})
+
+    def fail(self, tier, blend, material, error):
+        self._write({"event": "fail", "tier": tier, "blend": blend, "material": material, "error": error})
+        return self.jobs[(tier, blend)][material]["state"]
+
+    def finish_run(self):
+        self._write({"event": "complete"})
+        self.compact()
+
+    # ---------- Queries ----------
+    def needs_work(self, tier, blend, now=None):
+        jobs = self.jobs.get((tier, blend))
+        if jobs is None:
+            # Never enumerated
+            return True
+        now = time.time() if now is None else now
+        return any(
+            job["state"] in (QUEUED, RUNNING) or (job["state"] == FAILED and job["retry_at"] <= now)
+            for job in jobs.values()
+        )
+
+    def next_retry(self, tier, blends):
+        times = [
+            job["retry_at"]
+            for blend in blends
+            for job in self.jobs.get((tier, blend), {}).values()
+            if job["state"] == FAILED
+        ]
+        return min(times) if times else None
+
+    def skip_map(self, tier, blends, now=None):
+        """{blend: [materials]} a worker should not touch right now."""
+        now = time.time() if now is None else now
+        skip = {}
+        for blend in blends:
+            names = [
+                name for name, job in self.jobs.get((tier, blend), {}).items()
+                if job["state"] in (DONE, QUARANTINED)
+                or (job["state"] == FAILED and job["retry_at"] > now)
+            ]
+            if names:
+                skip[blend] = names
+        return skip
+
+    def counts(self):
+        totals = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, QUARANTINED: 0}
+        for jobs in self.jobs.values():
+            for job in jobs.values():
+                totals[job["state"]] += 1
+        return totals
+
+    def quarantined(self):
+        return [
+            (tier, blend, name, job["error"])
+            for (tier, blend), jobs in self.jobs.items()
+            for name, job in jobs.items()
+            if job["state"] == QUARANTINED
+        ]
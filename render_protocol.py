@@ -0,0 +1,96 @@
+# Line protocol between the render launcher (preview_render.py) and the
+# Blender worker processes (preview_renderer.py).
+#
+# Workers print marker lines on stdout next to their normal log output:
+#   @@QUEUE\t<blend file>\t<material>...  materials found in a file
+#   @@START\t<blend file>\t<material>   work on a material begins
+#   @@DONE\t<blend file>\t<material>    material rendered or skipped
+#   @@FAIL\t<blend file>\t<material>\t<error>   material (or "" for the
+#                                        whole file) could not be rendered
+#   @@BLEND_DONE\t<blend file>           every material of the file handled
+#   @@RECYCLE\t<rss MB>                  worker is exiting to free memory
+#   @@CALIBRATED\t<renders>\t<seconds>   timing from a calibration run
+# A material's thumbnail is saved while the next one renders, so its DONE
+# (or FAIL) may come after the next START.
+# A recycling worker exits with RECYCLE_EXIT_CODE and the launcher starts a
+# fresh one for the remaining work. Kept free of bpy for both sides.
+
+import os
+import json
+import tempfile
+
+MARKER = "@@"
+RECYCLE_EXIT_CODE = 75
+
+
+def format_marker(kind, *fields):
+    # Error messages may span lines; a marker has to stay on one
+    fields = tuple(str(f).replace("\t", " ").replace("\r", " ").replace("\n", " ") for f in fields)
+    return "\t".join((MARKER + kind,) + fields)
+
+
+def parse_marker(line):
+    """Return (kind, fields) for a marker line, or None for ordinary output."""
+    if not line.startswith(MARKER):
+        return None
+    parts = line.rstrip("\r\n").split("\t")
+    return parts[0][len(MARKER):], parts[1:]
+
+
+def write_skip_file(done):
+    """Write {blend file: [materials]} for a restarted worker to skip."""
+    fd, path = tempfile.mkstemp(prefix="tmg_render_skip_", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({blend: sorted(names) for blend, names in done.items()}, f)
+    return path
+
+
+def read_skip_file(path):
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {blend: set(names) for blend, names in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def process_rss_bytes():
+    """Current resident set size of this process, or 0 if unknown."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    if os.name == "nt":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        except Exception:
+            return 0
+        return 0
+
+    try:
+        import resource
+        # Peak rather than current RSS on macOS (bytes there, KB elsewhere)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    except Exception:
+        return 0
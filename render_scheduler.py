@@ -0,0 +1,131 @@
+# Splits the machine's cores between concurrent preview render workers.
+#
+# Each worker gets a contiguous block of whole physical cores (SMT siblings
+# stay together), renders with exactly that many threads and can be pinned
+# to them, so N workers never ask for more than the machine has. Which split
+# is fastest depends on the CPU and the scene, so the launcher can measure a
+# few and remember the winner per machine. Kept free of bpy.
+
+import os
+import json
+import platform
+
+# Workers spend part of every material loading and saving, which a few
+# threads cover; more, smaller workers keep the cores busier
+THREADS_PER_WORKER = 4
+
+
+def available_cpus():
+    """Logical CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def physical_cores(cpus):
+    """Group logical CPUs by the physical core they share, in CPU order."""
+    groups = {}
+    for cpu in cpus:
+        topology = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(os.path.join(topology, "physical_package_id")) as f:
+                package = int(f.read())
+            with open(os.path.join(topology, "core_id")) as f:
+                core = int(f.read())
+            key = (package, core)
+        except (OSError, ValueError):
+            # No topology (not Linux): every logical CPU counts as a core
+            key = ("cpu", cpu)
+        groups.setdefault(key, []).append(cpu)
+    return sorted(groups.values())
+
+
+def default_worker_count(cpus=None):
+    cores = physical_cores(cpus or available_cpus())
+    return max(1, len(cores) // THREADS_PER_WORKER)
+
+
+def plan_workers(workers, cpus=None):
+    """Split the CPUs into `workers` slots of {"cpus": [...], "threads": n}."""
+    cpus = cpus or available_cpus()
+    cores = physical_cores(cpus)
+    workers = max(1, min(workers, len(cpus)))
+    if workers > len(cores):
+        # More workers than physical cores: split the SMT siblings too
+        cores = [[cpu] for cpu in cpus]
+
+    slots = []
+    for i in range(workers):
+        # Leftover cores go to the first slots
+        block = cores[i * len(cores) // workers:(i + 1) * len(cores) // workers]
+        slot_cpus = sorted(cpu for core in block for cpu in core)
+        slots.append({"cpus": slot_cpus, "threads": len(slot_cpus)})
+    return slots
+
+
+def calibration_splits(cpus=None):
+    """Worker counts worth measuring: powers of two up to one per core."""
+    cores = len(physical_cores(cpus or available_cpus()))
+    counts = []
+    workers = 1
+    while workers < cores:
+        counts.append(workers)
+        workers *= 2
+    counts.append(cores)
+    return counts
+
+
+def format_cpus(cpus):
+    return ",".join(str(cpu) for cpu in cpus)
+
+
+def parse_cpus(text):
+    return [int(cpu) for cpu in text.split(",") if cpu.strip()]
+
+
+def pin_to(cpus):
+    """Restrict this process to `cpus`. Returns False where unsupported."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError:
+        return False
+    return True
+
+
+# ---------- Calibration results ----------
+def machine_key():
+    return {"host": platform.node(), "cpus": len(available_cpus())}
+
+
+def save_calibration(path, workers, results):
+    """Remember the fastest worker count for this machine.
+
+    `results` is a list of {"workers", "threads", "per_minute"} dicts.
+    """
+    data = dict(machine_key(), workers=workers, results=results)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_calibration(path):
+    """Calibrated worker count for this machine, or 0 if there is none."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    # A different machine, or a VM resized since, needs its own calibration
+    if any(data.get(key) != value for key, value in machine_key().items()):
+        return 0
+    return int(data.get("workers", 0))
+
+
+def resolve_worker_count(requested, calibration_path, cpus=None):
+    if requested > 0:
+        return requested
+    return load_calibration(calibration_path) or default_worker_count(cpus)
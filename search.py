@@ -0,0 +1,162 @@
+# Ranked fuzzy material search.
+#
+# Names are indexed once into trigram posting lists. A query only touches
+# the postings of its own trigrams, so scoring cost follows the number of
+# plausible candidates rather than the library size, and the best K results
+# are kept in a bounded heap instead of sorting every match. Names can be
+# added in batches as a refresh delivers them, without rebuilding.
+
+import heapq
+from bisect import bisect_right
+from collections import Counter
+
+SUBSTRING_BONUS = 1.0
+PREFIX_BONUS = 0.25
+SUBSEQUENCE_BONUS = 0.3
+MIN_SIMILARITY = 0.45
+
+_SEPARATORS = str.maketrans("_-.", "   ")
+
+
+def normalize(text):
+    return text.lower().translate(_SEPARATORS)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def is_subsequence(query, name):
+    chars = iter(name)
+    return all(c in chars for c in query)
+
+
+class SearchIndex:
+    def __init__(self, names=()):
+        self.names = []
+        self.trigram_counts = []
+        self.postings = {}
+        self.offsets = []
+        self._blob = None
+        self.add(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, names):
+        """Index more names; their ids continue from the current length."""
+        postings = self.postings
+        offset = self.offsets[-1] + len(self.names[-1]) + 1 if self.names else 0
+        for name in names:
+            name = normalize(name)
+            item_id = len(self.names)
+            self.names.append(name)
+            self.offsets.append(offset)
+            offset += len(name) + 1
+
+            grams = set(trigrams(name))
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = [item_id]
+                else:
+                    posting.append(item_id)
+        self._blob = None
+
+    @property
+    def blob(self):
+        # All names in one string so substring hits are found by str.find
+        # at C speed; offsets map a hit back to its item id. Joined again
+        # after an add, which is cheap next to indexing the trigrams.
+        if self._blob is None:
+            self._blob = "\n".join(self.names)
+        return self._blob
+
+    def prefix_hits(self, query, k, allowed):
+        # A query shorter than a trigram: a scan would hit nearly every
+        # name, so only names (one letter) or words (two) starting with it
+        posting = self.postings.get(f"  {query}"[-3:], ())
+        result = []
+        for item_id in posting:
+            if allowed is None or allowed(item_id):
+                result.append(item_id)
+                if len(result) >= k:
+                    break
+        return result
+
+    def substring_hits(self, query):
+        hits = {}
+        blob, offsets = self.blob, self.offsets
+        position = blob.find(query)
+        while position >= 0:
+            item_id = bisect_right(offsets, position) - 1
+            start = position - offsets[item_id]
+            if start == 0 or blob[position - 1] == " ":
+                hits[item_id] = SUBSTRING_BONUS + PREFIX_BONUS
+            else:
+                hits.setdefault(item_id, SUBSTRING_BONUS)
+            position = blob.find(query, position + 1)
+        return hits
+
+    def search(self, query, k=100, allowed=None):
+        """Return up to `k` item ids ordered best match first.
+
+        `allowed(item_id)` can veto candidates (e.g. the category filter)
+        before they are scored into the heap.
+        """
+        query = normalize(query).strip()
+        if not query or k <= 0:
+            return []
+        if len(query) < 3:
+            return self.prefix_hits(query, k, allowed)
+
+        query_grams = set(trigrams(query))
+        query_size = len(query_grams)
+        shared = Counter()
+        for gram in query_grams:
+            posting = self.postings.get(gram)
+            if posting:
+                shared.update(posting)
+
+        names = self.names
+        counts = self.trigram_counts
+        heap = []
+
+        def push(score, item_id):
+            # Negative id keeps index order among equal scores
+            entry = (score, -item_id)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        def similarity(common, item_id):
+            # Share of the query's trigrams found in the name, with a little
+            # Dice similarity mixed in so tighter names rank first.
+            return common / query_size + 0.1 * (2.0 * common / (query_size + counts[item_id]))
+
+        # Substring hits first: they fill the heap with high scores, which
+        # lets most trigram-only candidates be rejected on a bound check.
+        hits = self.substring_hits(query)
+        for item_id, bonus in hits.items():
+            if allowed is None or allowed(item_id):
+                push(bonus + similarity(shared.get(item_id, 0), item_id), item_id)
+
+        for item_id, common in shared.items():
+            if item_id in hits:
+                continue
+            score = similarity(common, item_id)
+            if score + SUBSEQUENCE_BONUS < MIN_SIMILARITY:
+                continue
+            if len(heap) >= k and score + SUBSEQUENCE_BONUS <= heap[0][0]:
+                continue
+            if allowed is not None and not allowed(item_id):
+                continue
+            if is_subsequence(query, names[item_id]):
+                score += SUBSEQUENCE_BONUS
+            if score >= MIN_SIMILARITY:
+                push(score, item_id)
+
+        return [-item_id for score, item_id in sorted(heap, reverse=True)]
@@ -0,0 +1,149 @@
+# "Similar materials" search over fixed-length feature vectors.
+#
+# Indexing describes every material with three blocks of numbers: how many
+# nodes of each common type its tree has (structure), its Principled BSDF
+# settings and base color (shading), and a coarse color histogram of its
+# thumbnail (look). Each block is normalized and weighted on its own, so
+# the cosine similarity of two rows is a weighted sum of the three block
+# similarities. All rows live in one contiguous float32 matrix and a query
+# is a single matrix product plus a partial sort for the top K.
+
+import math
+
+import numpy as np
+
+NODE_TYPES = (
+    "TEX_IMAGE", "TEX_NOISE", "TEX_VORONOI", "TEX_WAVE", "TEX_MUSGRAVE", "TEX_GRADIENT",
+    "TEX_CHECKER", "TEX_BRICK", "TEX_MAGIC", "TEX_ENVIRONMENT",
+    "MIX", "MIX_RGB", "VALTORGB", "CURVE_RGB", "HUE_SAT", "BRIGHTCONTRAST", "INVERT", "GAMMA",
+    "MATH", "VECT_MATH", "MAPPING", "TEX_COORD", "UVMAP",
+    "NORMAL_MAP", "BUMP", "DISPLACEMENT", "SEPARATE_COLOR", "COMBINE_COLOR",
+    "BSDF_PRINCIPLED", "BSDF_DIFFUSE", "BSDF_GLOSSY", "BSDF_GLASS", "BSDF_TRANSPARENT",
+    "EMISSION", "MIX_SHADER", "ADD_SHADER", "SUBSURFACE_SCATTERING", "PRINCIPLED_VOLUME",
+    "LAYER_WEIGHT", "FRESNEL", "AMBIENT_OCCLUSION", "GROUP",
+)
+NODE_SLOTS = {node_type: i for i, node_type in enumerate(NODE_TYPES)}
+
+# Principled BSDF inputs, with their pre-4.0 names, and how to scale them to 0..1
+PRINCIPLED_INPUTS = (
+    (("Metallic",), 1.0, 0.0),
+    (("Roughness",), 1.0, 0.0),
+    (("IOR",), 0.5, 1.0),
+    (("Alpha",), 1.0, 0.0),
+    (("Transmission Weight", "Transmission"), 1.0, 0.0),
+    (("Emission Strength",), 0.1, 0.0),
+    (("Coat Weight", "Clearcoat"), 1.0, 0.0),
+    (("Sheen Weight", "Sheen"), 1.0, 0.0),
+    (("Subsurface Weight", "Subsurface"), 1.0, 0.0),
+    (("Specular IOR Level", "Specular"), 1.0, 0.0),
+    (("Anisotropic",), 1.0, 0.0),
+)
+# Whether these inputs are driven by textures rather than a constant
+LINKED_INPUTS = ("Base Color", "Roughness", "Normal")
+# A linked input counts as halfway
+LINKED_VALUE = 0.5
+
+STRUCTURE_DIM = len(NODE_TYPES) + 1
+SHADING_DIM = len(PRINCIPLED_INPUTS) + len(LINKED_INPUTS) + 3
+FEATURE_DIM = STRUCTURE_DIM + SHADING_DIM
+# The base color is the last part of the shading block
+BASE_COLOR = slice(FEATURE_DIM - 3, FEATURE_DIM)
+
+COLOR_LEVELS = 3
+COLOR_DIM = COLOR_LEVELS ** 3
+
+# Share of structure, shading and look in the final similarity
+BLOCK_WEIGHTS = (0.35, 0.35, 0.3)
+
+
+def material_features(type_counts, principled, base_color):
+    """Feature vector of one material as a list of FEATURE_DIM floats.
+
+    `type_counts` maps node types to counts, `principled` maps input names
+    to (value or None, linked).
+    """
+    structure = [0.0] * STRUCTURE_DIM
+    for node_type, count in type_counts.items():
+        # Counts are damped so one huge tree doesn't swamp the histogram
+        structure[NODE_SLOTS.get(node_type, STRUCTURE_DIM - 1)] += math.log1p(count)
+
+    shading = []
+    for names, scale, offset in PRINCIPLED_INPUTS:
+        value, linked = next((principled[name] for name in names if name in principled), (0.0, False))
+        if linked or value is None:
+            shading.append(LINKED_VALUE)
+        else:
+            shading.append(min(1.0, max(0.0, (value - offset) * scale)))
+    shading += [1.0 if principled.get(name, (None, False))[1] else 0.0 for name in LINKED_INPUTS]
+    shading += [min(1.0, max(0.0, c)) for c in list(base_color)[:3]]
+
+    return [round(value, 4) for value in structure + shading]
+
+
+def color_histogram(pixels):
+    """Normalized COLOR_DIM-bin RGB histogram of an (h, w, 3+) array in 0..1."""
+    rgb = np.asarray(pixels, dtype=np.float32)[..., :3].reshape(-1, 3)
+    levels = np.clip((rgb * COLOR_LEVELS).astype(np.int32), 0, COLOR_LEVELS - 1)
+    bins = (levels[:, 0] * COLOR_LEVELS + levels[:, 1]) * COLOR_LEVELS + levels[:, 2]
+    counts = np.bincount(bins, minlength=COLOR_DIM).astype(np.float32)
+    counts /= max(1.0, float(counts.sum()))
+    return [round(float(c), 4) for c in counts]
+
+
+def flat_histograms(features):
+    """(n, COLOR_DIM) histograms of each row's flat base color, for
+    materials without a thumbnail histogram."""
+    rgb = np.asarray(features, dtype=np.float32)[:, BASE_COLOR]
+    levels = np.clip((rgb * COLOR_LEVELS).astype(np.int32), 0, COLOR_LEVELS - 1)
+    bins = (levels[:, 0] * COLOR_LEVELS + levels[:, 1]) * COLOR_LEVELS + levels[:, 2]
+    histograms = np.zeros((len(rgb), COLOR_DIM), dtype=np.float32)
+    histograms[np.arange(len(rgb)), bins] = 1.0
+    return histograms
+
+
+def _normalize(block):
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    return np.divide(block, norms, out=np.zeros_like(block), where=norms > 0)
+
+
+class SimilarityIndex:
+    def __init__(self, features, colors):
+        """`features` is (n, FEATURE_DIM), `colors` (n, COLOR_DIM); float32."""
+        features = np.asarray(features, dtype=np.float32).reshape(-1, FEATURE_DIM)
+        colors = np.asarray(colors, dtype=np.float32).reshape(-1, COLOR_DIM)
+        blocks = (features[:, :STRUCTURE_DIM], features[:, STRUCTURE_DIM:], colors)
+        parts = [_normalize(block) * math.sqrt(weight) for block, weight in zip(blocks, BLOCK_WEIGHTS)]
+        self.matrix = np.ascontiguousarray(_normalize(np.hstack(parts)), dtype=np.float32)
+        # Materials indexed before features existed never match
+        self.valid = features.any(axis=1)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def query(self, item_ids, k=100, allowed=None):
+        """Top `k` (ids, scores) for each of `item_ids`, best first.
+
+        All queries go through one matrix product. `allowed` is an optional
+        boolean mask of candidate ids. Lists may come back shorter than `k`.
+        """
+        item_ids = np.asarray(item_ids, dtype=np.int64).reshape(-1)
+        scores = self.matrix[item_ids] @ self.matrix.T
+        excluded = ~self.valid if allowed is None else ~(self.valid & allowed)
+        scores[:, excluded] = -np.inf
+        scores[np.arange(len(item_ids)), item_ids] = -np.inf
+
+        k = min(k, len(self) - 1)
+        if k <= 0:
+            return [[] for _ in item_ids], [[] for _ in item_ids]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        ids, result_scores = [], []
+        for row_ids, row_scores in zip(top, top_scores):
+            keep = np.isfinite(row_scores)
+            ids.append(row_ids[keep].tolist())
+            result_scores.append(row_scores[keep].tolist())
+        return ids, result_scores
@@ -0,0 +1,128 @@
+# Placeholder thumbnails ("swatches") for materials that have not been
+# rendered yet.
+#
+# A swatch is the material's base-color texture box-filtered down to a tile,
+# or a flat tile of its Principled BSDF base color when it has no texture.
+# They go into the thumbnail store with tier "swatch", so the first real
+# render of the material replaces them.
+
+import bpy
+
+import numpy as np
+
+from .thumb_store import store_bytes, set_thumbnail
+from .similarity import color_histogram
+from .thumb_codec import linear_to_srgb, encode_png
+
+SWATCH_SIZE = 128
+# Textures are scaled to this in C right after decoding, the box filter
+# does the rest
+DECODE_SIZE = 512
+SWATCH_TIER = "swatch"
+
+
+def box_downsample(pixels, size=SWATCH_SIZE):
+    """Center-crop an (h, w, c) array to a square and average it to size x size."""
+    h, w = pixels.shape[:2]
+    side = min(h, w)
+    top, left = (h - side) // 2, (w - side) // 2
+    square = pixels[top:top + side, left:left + side]
+
+    if side < size:
+        # Small textures are repeated up to the tile size
+        index = np.arange(size) * side // size
+        return square[index][:, index]
+
+    factor = side // size
+    square = square[:factor * size, :factor * size]
+    return square.reshape(size, factor, size, factor, -1).mean(axis=(1, 3))
+
+
+def flat_tile(color, size=SWATCH_SIZE):
+    rgb = linear_to_srgb(np.asarray(color[:3], dtype=np.float32))
+    tile = np.empty((size, size, 4), dtype=np.float32)
+    tile[..., :3] = rgb
+    tile[..., 3] = 1.0
+    return tile
+
+
+def load_image_pixels(path, max_size=DECODE_SIZE):
+    """Decode an image into an (h, w, 4) float array, top row first.
+
+    Loaded into a throwaway Main so nothing is added to the open file.
+    """
+    with bpy.data.temp_data() as temp_data:
+        image = temp_data.images.load(path, check_existing=False)
+        try:
+            width, height = image.size
+            if not width or not height:
+                return None
+            scale = max(width, height) / max_size
+            if scale > 1.0:
+                image.scale(max(1, round(width / scale)), max(1, round(height / scale)))
+                width, height = image.size
+
+            pixels = np.empty(width * height * 4, dtype=np.float32)
+            image.pixels.foreach_get(pixels)
+            pixels = pixels.reshape(height, width, 4)[::-1]
+            if image.is_float:
+                pixels[..., :3] = linear_to_srgb(pixels[..., :3])
+            return pixels
+        finally:
+            temp_data.images.remove(image)
+
+
+def texture_tile(path):
+    pixels = load_image_pixels(path)
+    if pixels is None:
+        return None
+    tile = box_downsample(pixels)
+    # Swatches are opaque even for textures with alpha
+    tile[..., 3] = 1.0
+    return tile
+
+
+def missing_swatches(manifest, base_colors):
+    """Split materials without any thumbnail into flat-color and texture jobs."""
+    flat, textured = [], []
+    entries = manifest["materials"]
+    for name, base_color in base_colors.items():
+        if name in entries or not base_color:
+            continue
+        if base_color.get("image"):
+            textured.append((name, base_color))
+        else:
+            flat.append((name, base_color))
+    return flat, textured
+
+
+def add_flat_swatches(folder, manifest, jobs):
+    """Store flat-color swatches. Needs no bpy, so it can run on a thread."""
+    swatches = {}
+    for name, base_color in jobs:
+        color = tuple(round(c, 4) for c in base_color.get("color", (0.8, 0.8, 0.8))[:3])
+        swatch = swatches.get(color)
+        if swatch is None:
+            tile = flat_tile(color)
+            swatch = swatches[color] = (store_bytes(folder, encode_png(tile), "png"), color_histogram(tile))
+        digest, colors = swatch
+        set_thumbnail(manifest, name, digest, "png", tier=SWATCH_TIER, colors=colors)
+    return len(jobs)
+
+
+def add_texture_swatch(folder, manifest, name, base_color, tile_cache):
+    """Store one swatch decoded from the base-color texture. Needs bpy."""
+    path = base_color["image"]
+    swatch = tile_cache.get(path)
+    if swatch is None:
+        try:
+            tile = texture_tile(path)
+        except Exception as e:
+            print(f"[MaterialBrowser] Failed to read {path} for a swatch: {e}")
+            tile = None
+        if tile is None:
+            tile = flat_tile(base_color.get("color", (0.8, 0.8, 0.8)))
+        swatch = tile_cache[path] = (store_bytes(folder, encode_png(tile), "png"), color_histogram(tile))
+    digest, colors = swatch
+    set_thumbnail(manifest, name, digest, "png", tier=SWATCH_TIER, colors=colors)
+    return digest
@@ -0,0 +1,69 @@
+# Blender checks the signature of the callbacks it is handed: register_class
+# rejects a draw() or execute() that doesn't take (self, context), and a
+# property refuses an update callback that doesn't take two arguments. The
+# bpy stub checks neither, so this test does it for every registered one.
+#
+#   python -m pytest tests
+
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "benchmarks"))
+
+import run_benchmarks
+
+bpy = run_benchmarks.bpy
+
+CALLBACK_METHODS = ("draw", "execute")
+
+
+def update_callbacks(addon):
+    """(owner, property name, callback) of every property with an update callback."""
+    callbacks = []
+    for cls in addon.classes:
+        for name, prop in getattr(cls, "__annotations__", {}).items():
+            if isinstance(prop, tuple) and prop[1].get("update"):
+                callbacks.append((cls.__name__, name, prop[1]["update"]))
+    for owner in (bpy.types.Scene, bpy.types.WindowManager):
+        for name, prop in vars(owner).items():
+            if isinstance(prop, tuple) and prop[1].get("update"):
+                callbacks.append((owner.__name__, name, prop[1]["update"]))
+    return callbacks
+
+
+class CallbackSignatureTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        if not getattr(bpy, "__stub__", False):
+            raise unittest.SkipTest("only needed with the bpy stub")
+        cls.addon = run_benchmarks.load_addon()
+        cls.addon.register()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.addon.unregister()
+
+    def test_draw_and_execute_take_self_and_context(self):
+        checked = 0
+        for cls in self.addon.classes:
+            for method in CALLBACK_METHODS:
+                func = vars(cls).get(method)
+                if func is None:
+                    continue
+                checked += 1
+                with self.subTest(cls=cls.__name__, method=method):
+                    self.assertEqual(func.__code__.co_argcount, 2)
+        self.assertGreater(checked, 0)
+
+    def test_update_callbacks_take_self_and_context(self):
+        callbacks = update_callbacks(self.addon)
+        self.assertGreater(len(callbacks), 0)
+        for owner, name, callback in callbacks:
+            with self.subTest(owner=owner, prop=name):
+                self.assertEqual(callback.__code__.co_argcount, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+# Pixel conversions and PNG encoding for thumbnails, without bpy.
+#
+# Render workers hand rendered pixels over as float RGBA arrays and encode
+# them on a thread, so this has to stay importable outside Blender (and
+# without relative imports, like the other helpers the workers load).
+
+import zlib
+import struct
+
+import numpy as np
+
+
+def linear_to_srgb(rgb):
+    rgb = np.clip(rgb, 0.0, 1.0)
+    return np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * np.power(rgb, 1.0 / 2.4) - 0.055)
+
+
+def to_rgba8(pixels):
+    """(h, w, 4) float pixels in 0..1 as a uint8 array of the same shape."""
+    return (np.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+
+def encode_png(tile):
+    """Encode an (h, w, 4) float tile in 0..1, top row first, as RGBA8 PNG bytes."""
+    h, w = tile.shape[:2]
+    rgba = to_rgba8(tile)
+    # Filter type 0 in front of every row
+    raw = np.zeros((h, w * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(h, w * 4)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
@@ -0,0 +1,456 @@
+# Content-addressed thumbnail store shared by every library in a folder.
+#
+#   <folder>/_Thumbs/<hash[:2]>/<hash>.<ext>     one file per unique image
+#   <folder>/<blend>_Data/thumbs.json            material name -> hash
+#
+# Identical thumbnails (duplicated or variant materials) are stored and
+# loaded once, and same-named materials in different libraries no longer
+# collide. Kept free of bpy so the render workers can import it too.
+#
+# Several artists and render workers may write the same library at once.
+# Manifests (and the browser's index files) are therefore written to a temp
+# file and renamed into place, under an advisory lock, and carry a
+# generation number: a save that finds a newer generation on disk than the
+# one it loaded merges its own changes into that instead of overwriting it.
+#
+# Render workers can also append raw pixels to a per-library pack instead:
+#
+#   <folder>/<blend>_Data/thumbs.pack            records of deflated RGBA8
+#
+# Manifest entries with ext "pack" refer to a record by the hash of its
+# pixels, which the browser hands to Blender without decoding an image.
+
+import os
+import json
+import time
+import zlib
+import struct
+import shutil
+import hashlib
+import tempfile
+import threading
+import contextlib
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+STORE_FOLDER = "_Thumbs"
+MANIFEST_NAME = "thumbs.json"
+MANIFEST_VERSION = 1
+CACHE_SUFFIX = "_Data"
+PREVIEW_FOLDER = "previews"
+IMAGE_EXTS = (".png", ".jpg")
+PACK_NAME = "thumbs.pack"
+PACK_EXT = "pack"
+PACK_MAGIC = b"TPK1"
+# magic, pixel hash, time written, width, height, payload size
+PACK_HEADER = struct.Struct("<4s16sdHHI")
+LOCK_TIMEOUT = 30.0
+# Stored images younger than this are never collected: another client may
+# have written one and not yet saved the manifest that refers to it
+GC_MIN_AGE = 3600.0
+# Materials set since the manifest was loaded; never written to disk
+CHANGED_KEY = "_changed"
+
+
+def safe_filename(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+
+
+def store_root(folder):
+    return os.path.join(folder, STORE_FOLDER)
+
+
+def scratch_folder(folder):
+    # Render workers write here before the result is hashed into the store
+    return os.path.join(store_root(folder), ".tmp_render")
+
+
+def store_path(folder, digest, ext):
+    return os.path.join(store_root(folder), digest[:2], f"{digest}.{ext}")
+
+
+def manifest_path(folder, blend_file):
+    blend_name = os.path.splitext(blend_file)[0]
+    return os.path.join(folder, blend_name + CACHE_SUFFIX, MANIFEST_NAME)
+
+
+def pack_path(folder, blend_file):
+    blend_name = os.path.splitext(blend_file)[0]
+    return os.path.join(folder, blend_name + CACHE_SUFFIX, PACK_NAME)
+
+
+def hash_bytes(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_write(path, data):
+    """Replace `path` with `data` so readers see the old or the new file, never half of one."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ---------- Locking ----------
+# POSIX record locks belong to the process, so threads of one process are
+# kept apart with a plain lock per path as well
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _try_lock(fd):
+    if os.name == "nt":
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    else:
+        # lockf rather than flock: it also works across NFS and SMB
+        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _unlock(fd):
+    if os.name == "nt":
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.lockf(fd, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT):
+    """Advisory lock on `path`, held through `path`.lock, for read-modify-write.
+
+    The OS drops the lock when its holder dies, so a leftover .lock file
+    never blocks anyone. Raises TimeoutError if it can't be had in time.
+    """
+    key = os.path.normcase(os.path.abspath(path))
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(key, threading.Lock())
+    if not thread_lock.acquire(timeout=timeout):
+        raise TimeoutError(f"Timed out waiting for the lock on {path}")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    _try_lock(fd)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Timed out waiting for the lock on {path}")
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                _unlock(fd)
+        finally:
+            os.close(fd)
+    finally:
+        thread_lock.release()
+
+
+def store_bytes(folder, data, ext):
+    """Add encoded image bytes to the store and return their hash."""
+    digest = hash_bytes(data)
+    path = store_path(folder, digest, ext)
+    if not os.path.exists(path):
+        atomic_write(path, data)
+    return digest
+
+
+def store_file(folder, source_path, move=False):
+    """Add an image file to the store and return (hash, ext)."""
+    ext = os.path.splitext(source_path)[1].lower().lstrip(".")
+    digest = hash_file(source_path)
+    path = store_path(folder, digest, ext)
+    if os.path.exists(path):
+        if move:
+            os.remove(source_path)
+        return digest, ext
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if move:
+        os.replace(source_path, path)
+    else:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+    return digest, ext
+
+
+# ---------- Packs ----------
+# pack path -> ((size, mtime_ns), {hash: (width, height, payload start, end)},
+# end of the last whole record, (hash, payload start) of that record), so
+# appends and polls only read the records added since the last look
+_pack_index = {}
+
+
+def _scan_pack(data):
+    """Yield (digest, written, width, height, payload start, end) per record.
+
+    Stops at the first torn or foreign record, e.g. from a crashed writer.
+    """
+    offset = 0
+    while offset + PACK_HEADER.size <= len(data):
+        magic, digest, written, width, height, size = PACK_HEADER.unpack_from(data, offset)
+        start = offset + PACK_HEADER.size
+        if magic != PACK_MAGIC or start + size > len(data):
+            return
+        yield digest.hex(), written, width, height, start, start + size
+        offset = start + size
+
+
+def _read_file(path, offset=0, size=-1):
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+    except OSError:
+        return b""
+
+
+def _pack_records(path):
+    """({hash: (width, height, payload start, end)}, end of the last whole
+    record) of a pack, reading only what was appended since the last call."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}, 0
+    stamp = (st.st_size, st.st_mtime_ns)
+    cached = _pack_index.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1], cached[2]
+
+    records, base, last = {}, 0, None
+    if cached and cached[3] and st.st_size >= cached[2]:
+        # Packs only grow between compactions. The last record seen still
+        # sitting where it was means this is the same pack, appended to.
+        digest, start = cached[3]
+        header = _read_file(path, start - PACK_HEADER.size, PACK_HEADER.size)
+        if len(header) == PACK_HEADER.size and PACK_HEADER.unpack(header)[1].hex() == digest:
+            records, base, last = cached[1], cached[2], cached[3]
+
+    end = base
+    for digest, _, width, height, start, stop in _scan_pack(_read_file(path, base)):
+        records[digest] = (width, height, base + start, base + stop)
+        end, last = base + stop, (digest, base + start)
+    _pack_index[path] = (stamp, records, end, last)
+    return records, end
+
+
+def read_pack(path, digests=None):
+    """{hash: (width, height, RGBA8 bytes, bottom row first)} of a pack.
+
+    Only the records in `digests` are read and inflated when it is given.
+    """
+    records, _ = _pack_records(path)
+    wanted = list(records) if digests is None else [digest for digest in digests if digest in records]
+    pixels = {}
+    if not wanted:
+        return pixels
+    try:
+        with open(path, "rb") as f:
+            for digest in wanted:
+                width, height, start, end = records[digest]
+                f.seek(start)
+                pixels[digest] = (width, height, zlib.decompress(f.read(end - start)))
+    except OSError:
+        pass
+    return pixels
+
+
+def append_to_pack(folder, blend_file, width, height, rgba):
+    """Append RGBA8 pixels (bottom row first) to the library's pack and
+    return their hash. Pixels already in the pack are not written again."""
+    digest = hash_bytes(rgba)
+    path = pack_path(folder, blend_file)
+    with file_lock(path):
+        records, end = _pack_records(path)
+        if digest in records:
+            return digest
+
+        payload = zlib.compress(rgba, 1)
+        header = PACK_HEADER.pack(PACK_MAGIC, bytes.fromhex(digest), time.time(), width, height, len(payload))
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            # Drop a torn tail, so the new record stays reachable
+            f.truncate(end)
+            f.seek(end)
+            f.write(header + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        start = end + len(header)
+        records[digest] = (width, height, start, start + len(payload))
+        st = os.stat(path)
+        _pack_index[path] = ((st.st_size, st.st_mtime_ns), records, start + len(payload), (digest, start))
+    return digest
+
+
+def compact_pack(folder, blend_file, referenced):
+    """Rewrite the library's pack without records no manifest refers to.
+
+    Returns the number of records dropped.
+    """
+    path = pack_path(folder, blend_file)
+    if not os.path.exists(path):
+        return 0
+    now = time.time()
+    with file_lock(path):
+        data = _read_file(path)
+        kept, dropped = [], 0
+        for digest, written, _, _, start, end in _scan_pack(data):
+            # Young records may belong to a manifest that is not saved yet
+            if digest in referenced or now - written < GC_MIN_AGE:
+                kept.append(data[start - PACK_HEADER.size:end])
+            else:
+                dropped += 1
+        if dropped:
+            atomic_write(path, b"".join(kept))
+            _pack_index.pop(path, None)
+    return dropped
+
+
+# ---------- Manifests ----------
+def _read_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "generation": 0, "materials": {}}
+    manifest.setdefault("materials", {})
+    manifest.setdefault("generation", 0)
+    return manifest
+
+
+def load_manifest(folder, blend_file):
+    return _read_manifest(manifest_path(folder, blend_file))
+
+
+def save_manifest(folder, blend_file, manifest):
+    """Write the materials set since loading, keeping everyone else's.
+
+    Afterwards `manifest` holds what is on disk, at its new generation.
+    """
+    path = manifest_path(folder, blend_file)
+    changed = manifest.pop(CHANGED_KEY, set())
+    try:
+        with file_lock(path):
+            current = _read_manifest(path)
+            if current["generation"] != manifest.get("generation", 0):
+                # Saved by someone else since we loaded it
+                merged = current["materials"]
+                for name in changed:
+                    merged[name] = manifest["materials"][name]
+                manifest["materials"] = merged
+
+            manifest["version"] = MANIFEST_VERSION
+            manifest["generation"] = current["generation"] + 1
+            atomic_write(path, json.dumps(manifest, indent=2).encode("utf-8"))
+    except BaseException:
+        # Keep the changes for the next attempt
+        manifest.setdefault(CHANGED_KEY, set()).update(changed)
+        raise
+
+
+def set_thumbnail(manifest, material_name, digest, ext, **extra):
+    entry = {"hash": digest, "ext": ext}
+    # The stamp of the last previews/ file copied in outlives a render, so
+    # that file only takes over again once it is replaced
+    source = manifest["materials"].get(material_name, {}).get("source")
+    if source:
+        entry["source"] = source
+    entry.update(extra)
+    manifest["materials"][material_name] = entry
+    manifest.setdefault(CHANGED_KEY, set()).add(material_name)
+
+
+def ingest_legacy_previews(folder, blend_file, material_names, manifest):
+    """Copy `<blend>_Data/previews/<material>.png|jpg` files into the store.
+
+    The files stay where they are, for older versions of the add-on and
+    other tools. Each copy records the file's size and mtime, so it is only
+    copied again once it changes, and a replaced preview replaces the
+    material's thumbnail. Returns True if the manifest changed.
+    """
+    blend_name = os.path.splitext(blend_file)[0]
+    preview_folder = os.path.join(folder, blend_name + CACHE_SUFFIX, PREVIEW_FOLDER)
+    try:
+        listing = os.listdir(preview_folder)
+    except OSError:
+        return False
+
+    files = {}
+    for fname in listing:
+        stem, ext = os.path.splitext(fname)
+        if ext.lower() in IMAGE_EXTS:
+            files.setdefault(stem, fname)
+
+    changed = False
+    entries = manifest["materials"]
+    for name in material_names:
+        fname = files.get(name) or files.get(safe_filename(name))
+        if not fname:
+            continue
+        path = os.path.join(preview_folder, fname)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        source = [st.st_size, st.st_mtime_ns]
+        if entries.get(name, {}).get("source") == source:
+            continue
+        try:
+            digest, ext = store_file(folder, path)
+        except OSError as e:
+            print(f"[MaterialBrowser] Failed to store preview {fname}: {e}")
+            continue
+        set_thumbnail(manifest, name, digest, ext, source=source)
+        changed = True
+    return changed
+
+
+def collect_garbage(folder, manifests):
+    """Delete stored images no manifest in `manifests` refers to."""
+    referenced = {entry["hash"] for manifest in manifests for entry in manifest["materials"].values()}
+    root = store_root(folder)
+    removed = 0
+    now = time.time()
+    if not os.path.isdir(root):
+        return removed
+    for bucket in os.listdir(root):
+        bucket_path = os.path.join(root, bucket)
+        if bucket.startswith(".") or not os.path.isdir(bucket_path):
+            continue
+        for fname in os.listdir(bucket_path):
+            if fname.startswith(".tmp_") or fname.endswith(".tmp"):
+                continue
+            if os.path.splitext(fname)[0] in referenced:
+                continue
+            path = os.path.join(bucket_path, fname)
+            try:
+                if now - os.path.getmtime(path) < GC_MIN_AGE:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+    return removed